@@ -172,9 +172,11 @@ CREATE INDEX idx_cognitive_sessions_created_at ON cognitive_sessions(created_at)
 CREATE INDEX idx_quiz_responses_session_id ON quiz_responses(session_id);
 CREATE INDEX idx_tasks_user_id ON tasks(user_id);
 CREATE INDEX idx_tasks_due_date ON tasks(due_date);
+CREATE INDEX ix_tasks_user_completed_due ON tasks(user_id, is_completed, due_date);
 CREATE INDEX idx_ai_messages_conversation_id ON ai_messages(conversation_id);
 CREATE INDEX idx_user_progress_user_id ON user_progress(user_id);
 CREATE INDEX idx_user_progress_measurement_date ON user_progress(measurement_date);
+CREATE INDEX ix_progress_user_metric_date ON user_progress(user_id, metric_name, measurement_date DESC);
 CREATE INDEX idx_emergency_alerts_user_id ON emergency_alerts(user_id);
 CREATE INDEX idx_emergency_alerts_created_at ON emergency_alerts(created_at);
 
@@ -3,7 +3,7 @@ Flask API for Cognitive Assessment Backend
 Provides endpoints for iOS app integration
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import json
 import os
@@ -43,7 +43,9 @@ def initialize_models():
     
     # Initialize Q-learning scheduler
     scheduler = QLearningScheduler()
-    if os.path.exists('../outputs/qlearning_model.json'):
+    if os.path.exists('../outputs/qlearning_model.npz'):
+        scheduler.load_model('../outputs/qlearning_model.npz')
+    elif os.path.exists('../outputs/qlearning_model.json'):
         scheduler.load_model('../outputs/qlearning_model.json')
     
     # Initialize quiz system
@@ -637,6 +639,24 @@ def generate_ai_memory_story():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/ai/memory_story/stream', methods=['POST'])
+def stream_ai_memory_story():
+    """Stream an AI-powered memory story as plain text chunks"""
+    try:
+        data = request.get_json()
+        
+        if not openai_summarizer:
+            return jsonify({'error': 'OpenAI summarizer not available'}), 503
+        
+        memory_item = data.get('memory_item', {})
+        performance = data.get('performance', {})
+        story_stream = openai_summarizer.stream_memory_story(memory_item, performance)
+        
+        return Response(stream_with_context(story_stream), mimetype='text/plain')
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
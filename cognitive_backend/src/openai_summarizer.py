@@ -4,24 +4,124 @@ Creates personalized summaries and recommendations for cognitive assessment resu
 """
 
 import openai
-import json
+import orjson
 import os
-from typing import Dict, List, Any
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Any, Optional, Iterator
 from datetime import datetime
-import pandas as pd
+
+MEMORY_STORY_SYSTEM_PROMPT = "You are a compassionate storyteller helping families preserve precious memories."
+
+# Shared pool for OpenAI calls so slow responses can be abandoned after a deadline
+_api_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="openai")
+# Calls running or queued in the pool at most; past that requests fall back immediately
+# instead of queueing behind calls that are stuck until their request_timeout
+_api_slots = threading.BoundedSemaphore(16)
 
 class OpenAISummarizer:
     """
     OpenAI-powered summarization for cognitive assessment results
     """
     
-    def __init__(self, api_key: str):
-        openai.api_key = api_key
+    def __init__(self, api_key: str, response_deadline: float = 3.0):
+        # Passed per request rather than assigned to the global openai.api_key
+        self.api_key = api_key
         self.model = "gpt-4o-mini"  # Using GPT-4o-mini for cost efficiency
+        
+        # Seconds to wait for OpenAI before answering with the fallback text
+        self.response_deadline = response_deadline
+        # Abandoned calls are still cut off by the HTTP client shortly after the deadline
+        # (openai otherwise waits up to 600s, holding a pool thread the whole time)
+        self.request_timeout = response_deadline + 1.0
+        
+        # Completion cache keyed on the exact prompt: prompts are built from the normalized
+        # inputs, so only identical results share a completion
+        self.completion_cache_size = 512
+        self._completion_cache = OrderedDict()  # (kind, prompt) -> response, oldest first
+        self._completion_cache_lock = threading.Lock()
+    
+    def _cache_lookup(self, kind: str, prompt: str) -> Optional[str]:
+        """Return the cached response for this exact prompt, if any"""
+        with self._completion_cache_lock:
+            response = self._completion_cache.get((kind, prompt))
+            if response is not None:
+                self._completion_cache.move_to_end((kind, prompt))
+            return response
+    
+    def _cache_store(self, kind: str, prompt: str, response: str):
+        """Add a prompt/response pair to the completion cache, dropping the oldest once full"""
+        with self._completion_cache_lock:
+            self._completion_cache[(kind, prompt)] = response
+            self._completion_cache.move_to_end((kind, prompt))
+            while len(self._completion_cache) > self.completion_cache_size:
+                self._completion_cache.popitem(last=False)
+    
+    def _chat_completion(self, kind: str, system_prompt: str, prompt: str,
+                         temperature: float, max_tokens: int) -> str:
+        """Run a chat completion, raising TimeoutError if it misses the response deadline"""
+        if not _api_slots.acquire(blocking=False):
+            raise TimeoutError("too many OpenAI calls pending")
+        try:
+            future = _api_executor.submit(
+                self._fetch_completion, kind, system_prompt, prompt, temperature, max_tokens
+            )
+        except Exception:
+            _api_slots.release()
+            raise
+        future.add_done_callback(lambda _: _api_slots.release())
+        try:
+            return future.result(timeout=self.response_deadline)
+        except FutureTimeoutError:
+            # Drops the call if it is still queued; a running call ends by request_timeout
+            # and its answer still lands in the completion cache
+            future.cancel()
+            raise TimeoutError(f"no response within {self.response_deadline:.1f}s")
+    
+    def _fetch_completion(self, kind: str, system_prompt: str, prompt: str,
+                          temperature: float, max_tokens: int) -> str:
+        """Fetch a chat completion, serving repeated prompts from the completion cache"""
+        cached = self._cache_lookup(kind, prompt)
+        if cached is not None:
+            return cached
+        
+        response = openai.ChatCompletion.create(
+            api_key=self.api_key,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            request_timeout=self.request_timeout
+        )
+        
+        content = response.choices[0].message.content
+        self._cache_store(kind, prompt, content)
+        return content
+    
+    @staticmethod
+    def _normalize(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Sort keys and compact nested dicts so equivalent inputs yield identical, shorter prompts.
+
+        Floats are left alone: each prompt formats them to the precision it prints.
+        """
+        normalized = {}
+        for key in sorted(data):
+            value = data[key]
+            if isinstance(value, dict):
+                value = orjson.dumps(value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+            normalized[key] = value
+        return normalized
     
     def generate_session_summary(self, session_data: Dict[str, Any]) -> Dict[str, str]:
         """Generate personalized summary for a quiz session"""
         
+        session_data = self._normalize(session_data)
+        
         # Convert string values to appropriate types
         accuracy = float(session_data.get('accuracy', 0))
         avg_response_time = float(session_data.get('avg_response_time', 0))
@@ -49,21 +149,18 @@ class OpenAISummarizer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a compassionate cognitive health specialist helping families with Alzheimer's care."},
-                    {"role": "user", "content": prompt}
-                ],
+            content = self._chat_completion(
+                "session_summary",
+                "You are a compassionate cognitive health specialist helping families with Alzheimer's care.",
+                prompt,
                 temperature=0.7,
                 max_tokens=500
             )
             
-            content = response.choices[0].message.content
             # Try to parse as JSON, fallback to structured text
             try:
-                return json.loads(content)
-            except json.JSONDecodeError:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
                 return self._parse_text_response(content)
                 
         except Exception as e:
@@ -73,6 +170,8 @@ class OpenAISummarizer:
     def generate_progress_summary(self, progress_data: Dict[str, Any]) -> Dict[str, str]:
         """Generate summary for user's overall progress"""
         
+        progress_data = self._normalize(progress_data)
+        
         # Convert string values to appropriate types
         total_sessions = int(progress_data.get('total_sessions', 0))
         avg_accuracy = float(progress_data.get('avg_accuracy', 0))
@@ -102,20 +201,17 @@ class OpenAISummarizer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a compassionate cognitive health specialist providing family guidance."},
-                    {"role": "user", "content": prompt}
-                ],
+            content = self._chat_completion(
+                "progress_summary",
+                "You are a compassionate cognitive health specialist providing family guidance.",
+                prompt,
                 temperature=0.7,
                 max_tokens=600
             )
             
-            content = response.choices[0].message.content
             try:
-                return json.loads(content)
-            except json.JSONDecodeError:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
                 return self._parse_text_response(content)
                 
         except Exception as e:
@@ -125,12 +221,14 @@ class OpenAISummarizer:
     def generate_clinician_report(self, assessment_data: Dict[str, Any]) -> Dict[str, str]:
         """Generate professional clinician report"""
         
+        assessment_data = self._normalize(assessment_data)
+        
         # Convert string values to appropriate types
         overall_accuracy = float(assessment_data.get('overall_accuracy', 0))
         overall_latency = float(assessment_data.get('overall_latency', 0))
         performance_trend = assessment_data.get('performance_trend', 'stable')
         improvement_score = float(assessment_data.get('improvement_score', 0))
-        load_band_distribution = assessment_data.get('load_band_distribution', {})
+        load_band_distribution = assessment_data.get('load_band_distribution', '{}')
         total_sessions = int(assessment_data.get('total_sessions', 0))
         
         prompt = f"""
@@ -155,20 +253,17 @@ class OpenAISummarizer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a clinical neuropsychologist writing professional assessment reports."},
-                    {"role": "user", "content": prompt}
-                ],
+            content = self._chat_completion(
+                "clinician_report",
+                "You are a clinical neuropsychologist writing professional assessment reports.",
+                prompt,
                 temperature=0.6,
                 max_tokens=800
             )
             
-            content = response.choices[0].message.content
             try:
-                return json.loads(content)
-            except json.JSONDecodeError:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
                 return self._parse_text_response(content)
                 
         except Exception as e:
@@ -178,6 +273,8 @@ class OpenAISummarizer:
     def generate_family_insights(self, family_data: Dict[str, Any]) -> Dict[str, str]:
         """Generate family-specific insights and recommendations"""
         
+        family_data = self._normalize(family_data)
+        
         prompt = f"""
         You are a family counselor specializing in Alzheimer's and dementia care, providing guidance to families.
         
@@ -200,30 +297,28 @@ class OpenAISummarizer:
         """
         
         try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a compassionate family counselor specializing in dementia care."},
-                    {"role": "user", "content": prompt}
-                ],
+            content = self._chat_completion(
+                "family_insights",
+                "You are a compassionate family counselor specializing in dementia care.",
+                prompt,
                 temperature=0.8,
                 max_tokens=700
             )
             
-            content = response.choices[0].message.content
             try:
-                return json.loads(content)
-            except json.JSONDecodeError:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
                 return self._parse_text_response(content)
                 
         except Exception as e:
             print(f"OpenAI API error: {e}")
             return self._generate_fallback_family_insights(family_data)
     
-    def generate_memory_story(self, memory_item: Dict[str, Any], performance: Dict[str, Any]) -> str:
-        """Generate a personalized story about a memory item based on performance"""
-        
-        prompt = f"""
+    def _memory_story_prompt(self, memory_item: Dict[str, Any], performance: Dict[str, Any]) -> str:
+        """Build the memory story prompt shared by the blocking and streaming variants"""
+        memory_item = self._normalize(memory_item)
+        performance = self._normalize(performance)
+        return f"""
         Create a warm, personalized story about this family memory based on the person's performance.
         
         Memory Item:
@@ -245,23 +340,65 @@ class OpenAISummarizer:
         
         Make it personal and emotionally supportive.
         """
+    
+    def generate_memory_story(self, memory_item: Dict[str, Any], performance: Dict[str, Any]) -> str:
+        """Generate a personalized story about a memory item based on performance"""
+        
+        prompt = self._memory_story_prompt(memory_item, performance)
         
         try:
+            content = self._chat_completion(
+                "memory_story",
+                MEMORY_STORY_SYSTEM_PROMPT,
+                prompt,
+                temperature=0.9,
+                max_tokens=200
+            )
+            
+            return content.strip()
+            
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            return self._generate_fallback_memory_story(memory_item, performance)
+    
+    def stream_memory_story(self, memory_item: Dict[str, Any], performance: Dict[str, Any]) -> Iterator[str]:
+        """Stream a personalized memory story as it is generated"""
+        
+        prompt = self._memory_story_prompt(memory_item, performance)
+        parts = []
+        
+        try:
+            cached = self._cache_lookup("memory_story", prompt)
+            if cached is not None:
+                yield cached.strip()
+                return
+            
             response = openai.ChatCompletion.create(
+                api_key=self.api_key,
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "You are a compassionate storyteller helping families preserve precious memories."},
+                    {"role": "system", "content": MEMORY_STORY_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.9,
-                max_tokens=200
+                max_tokens=200,
+                stream=True,
+                request_timeout=self.request_timeout
             )
             
-            return response.choices[0].message.content.strip()
+            for chunk in response:
+                token = chunk.choices[0].delta.get('content') or ''
+                if token:
+                    parts.append(token)
+                    yield token
+            
+            self._cache_store("memory_story", prompt, ''.join(parts))
             
         except Exception as e:
             print(f"OpenAI API error: {e}")
-            return self._generate_fallback_memory_story(memory_item, performance)
+            # Only fall back if nothing has reached the caller yet
+            if not parts:
+                yield self._generate_fallback_memory_story(memory_item, performance)
     
     def _parse_text_response(self, content: str) -> Dict[str, str]:
         """Parse text response into structured format"""
@@ -368,8 +505,9 @@ class OpenAISummarizer:
         else:
             return f"Memories like {title} are precious treasures. Take your time to remember - these family moments are worth every effort to preserve."
 
-def create_openai_summarizer() -> OpenAISummarizer:
-    """Create OpenAI summarizer with API key from environment"""
+@functools.lru_cache(maxsize=1)
+def _load_api_key() -> Optional[str]:
+    """Resolve the OpenAI API key once per process"""
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         # Try to load from a config file
@@ -380,6 +518,15 @@ def create_openai_summarizer() -> OpenAISummarizer:
             print("⚠️ OpenAI API key not found. Set OPENAI_API_KEY environment variable or create config/openai_key.txt")
             return None
     
+    return api_key
+
+@functools.lru_cache(maxsize=1)
+def create_openai_summarizer() -> OpenAISummarizer:
+    """Create OpenAI summarizer with API key from environment (shared per process)"""
+    api_key = _load_api_key()
+    if not api_key:
+        return None
+    
     return OpenAISummarizer(api_key)
 
 if __name__ == "__main__":
@@ -398,6 +545,6 @@ if __name__ == "__main__":
         
         summary = summarizer.generate_session_summary(session_data)
         print("Session Summary:")
-        print(json.dumps(summary, indent=2))
+        print(orjson.dumps(summary, option=orjson.OPT_INDENT_2).decode())
     else:
         print("OpenAI summarizer not available - using fallback summaries")
@@ -1,17 +1,202 @@
 """
 Q-Learning Spaced Retrieval Scheduler
-Uses tabular Q-learning to optimize memory review intervals
+Uses Q-learning with an additive linear Q-function to optimize memory review intervals
 """
 
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
-import json
+import orjson
 import os
+from bisect import bisect_left
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the kernels below then run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# Q(s,a) = w_diff[d,a] + w_streak[s,a] + w_ll[l,load,a]. The kernels take the flat
+# weight vector and the offsets of the three weight rows that make up a state.
+
+@njit(cache=True, fastmath=True)
+def _q_value(weights, d_base, s_base, ll_base, action):
+    """Q(s,a) as the sum of the state's three feature weights"""
+    return weights[d_base + action] + weights[s_base + action] + weights[ll_base + action]
+
+@njit(cache=True, fastmath=True)
+def _update_q(weights, d_base, s_base, ll_base, action, reward,
+              next_d_base, next_s_base, next_ll_base, n_actions, alpha, gamma):
+    """In-place TD update, splitting α*δ equally across the three feature weights"""
+    max_next_q = _q_value(weights, next_d_base, next_s_base, next_ll_base, 0)
+    for a in range(1, n_actions):
+        q = _q_value(weights, next_d_base, next_s_base, next_ll_base, a)
+        if q > max_next_q:
+            max_next_q = q
+    
+    current_q = _q_value(weights, d_base, s_base, ll_base, action)
+    share = alpha * (reward + gamma * max_next_q - current_q) / 3.0
+    weights[d_base + action] += share
+    weights[s_base + action] += share
+    weights[ll_base + action] += share
+
+@njit(cache=True, fastmath=True)
+def _replay_updates(weights, bases, actions, rewards, next_bases, count, n_actions, alpha, gamma):
+    """Apply buffered transitions in order, as the online updates would have"""
+    for i in range(count):
+        _update_q(weights, bases[i, 0], bases[i, 1], bases[i, 2], actions[i], rewards[i],
+                  next_bases[i, 0], next_bases[i, 1], next_bases[i, 2], n_actions, alpha, gamma)
+
+@njit(cache=True)
+def _reward(correct, latency_sec, difficulty, high_load):
+    """Reward for one review result (see QLearningScheduler.calculate_reward)"""
+    if correct:
+        # Base reward for correct answer
+        reward = 1.0
+        
+        # Bonus for faster response (up to 0.5 bonus)
+        if latency_sec <= 2.0:
+            reward += 0.5
+        elif latency_sec <= 5.0:
+            reward += 0.3
+        elif latency_sec <= 10.0:
+            reward += 0.1
+        
+        # Bonus for handling difficult items
+        if difficulty >= 3:
+            reward += 0.2
+        
+        # Bonus for handling high load situations
+        if high_load:
+            reward += 0.2
+    else:
+        # Penalty for incorrect answer
+        reward = -0.5
+        
+        # Extra penalty for easy items
+        if difficulty == 1:
+            reward -= 0.3
+    
+    return reward
+
+@njit(cache=True)
+def _safe_action(action, difficulty, success_streak, load_band):
+    """Clamp an action to the safety constraints (load_band is the 1-based band index)"""
+    # Don't use very long intervals for difficult items or high load
+    if difficulty >= 3 or load_band == 3:
+        action = min(action, 2)  # Max 2 minutes
+    
+    # Don't use very short intervals for easy items with good streak
+    if difficulty == 1 and success_streak >= 2 and load_band <= 2:
+        action = max(action, 1)  # Min 1 minute
+    
+    return action
+
+@njit(cache=True, fastmath=True)
+def _simulate_sessions(weights, row_offsets, n_load, n_actions, max_streak, max_latency_bin,
+                       max_load_bin, alpha, gamma, epsilon, states, last_action, totals, history,
+                       session_rows, session_load, difficulties, correct, latency, latency_bins,
+                       explore_uniforms, explore_actions):
+    """Run the scheduler over pre-drawn sessions, updating weights and per-row item records in place
+    
+    states[i] is (difficulty, streak, latency_bin, load_band) for item row i, with difficulty 0
+    marking an item the scheduler has not seen yet. Q updates are applied at the end of each session.
+    """
+    n_sessions, n_items = session_rows.shape
+    max_history = history.shape[1]
+    d_off, s_off, ll_off = row_offsets[0], row_offsets[1], row_offsets[2]
+    
+    bases = np.empty((n_items, 3), dtype=np.int64)
+    next_bases = np.empty((n_items, 3), dtype=np.int64)
+    actions = np.empty(n_items, dtype=np.int64)
+    rewards = np.empty(n_items, dtype=np.float32)
+    
+    for session in range(n_sessions):
+        load_band = session_load[session]
+        
+        for j in range(n_items):
+            row = session_rows[session, j]
+            if states[row, 0] == 0:
+                # Initialize new item
+                states[row, 0] = difficulties[row]
+                states[row, 1] = 0
+                states[row, 2] = 1
+                states[row, 3] = load_band
+            
+            difficulty = states[row, 0]
+            streak = states[row, 1]
+            d_base = d_off + min(difficulty - 1, 2) * n_actions
+            s_base = s_off + min(streak, max_streak) * n_actions
+            ll_base = ll_off + (min(states[row, 2], max_latency_bin) * n_load +
+                                min(states[row, 3] - 1, max_load_bin)) * n_actions
+            
+            # Epsilon-greedy choice; weights only change between sessions
+            if explore_uniforms[session, j] < epsilon:
+                action = explore_actions[session, j]
+            else:
+                action = 0
+                best_q = _q_value(weights, d_base, s_base, ll_base, 0)
+                for a in range(1, n_actions):
+                    q = _q_value(weights, d_base, s_base, ll_base, a)
+                    if q > best_q:
+                        best_q = q
+                        action = a
+            action = _safe_action(action, difficulty, streak, states[row, 3])
+            last_action[row] = action
+            
+            # Record the result and move the item to its new state
+            item_correct = correct[session, j]
+            reward = _reward(item_correct, latency[session, j], difficulty, load_band == 3)
+            new_streak = min(streak + 1, max_streak) if item_correct else 0
+            states[row, 1] = new_streak
+            states[row, 2] = latency_bins[session, j]
+            states[row, 3] = load_band
+            
+            bases[j, 0] = d_base
+            bases[j, 1] = s_base
+            bases[j, 2] = ll_base
+            next_bases[j, 0] = d_base
+            next_bases[j, 1] = s_off + min(new_streak, max_streak) * n_actions
+            next_bases[j, 2] = ll_off + (min(states[row, 2], max_latency_bin) * n_load +
+                                         min(load_band - 1, max_load_bin)) * n_actions
+            actions[j] = action
+            rewards[j] = reward
+            
+            pos = int(totals[row, 0]) % max_history
+            history[row, pos, 0] = 1.0 if item_correct else 0.0
+            history[row, pos, 1] = latency[session, j]
+            history[row, pos, 2] = reward
+            history[row, pos, 3] = action
+            totals[row, 0] += 1
+            totals[row, 1] += 1 if item_correct else 0
+            totals[row, 2] += latency[session, j]
+            totals[row, 3] += reward
+        
+        # Apply the session's Q updates in one batch
+        _replay_updates(weights, bases, actions, rewards, next_bases, n_items, n_actions, alpha, gamma)
+
+# Number of epsilon-greedy draws fetched from the generator at a time
+RANDOM_BLOCK_SIZE = 256
+
+# Recent results kept per item, as rows of (correct, latency_sec, reward, action)
+MAX_HISTORY = 32
+
+# Load band names -> 1-based band index used in item states
+LOAD_BAND_INDEX = {'low': 1, 'moderate': 2, 'high': 3}
+
+# Buffered (state, action, reward, next state) rows awaiting a batched Q update
+TRANSITION_DTYPE = np.dtype([
+    ('bases', np.int64, (3,)),
+    ('action', np.int64),
+    ('reward', np.float32),
+    ('next_bases', np.int64, (3,)),
+])
 
 class QLearningScheduler:
     """
-    Tabular Q-learning scheduler for spaced retrieval
+    Q-learning scheduler for spaced retrieval with an additive linear Q-function
     """
     
     def __init__(self, 
@@ -20,7 +205,8 @@ class QLearningScheduler:
                  epsilon: float = 0.1,
                  max_streak: int = 3,
                  max_latency_bin: int = 2,
-                 max_load_bin: int = 2):
+                 max_load_bin: int = 2,
+                 seed: Optional[int] = None):
         
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
@@ -36,13 +222,77 @@ class QLearningScheduler:
         self.actions = [30, 60, 120, 240]  # 30s, 1min, 2min, 4min
         self.n_actions = len(self.actions)
         
-        # Initialize Q-table
-        self.q_table = np.zeros(self.state_dims + (self.n_actions,))
+        # Random draws for epsilon-greedy come from one Generator, prefetched in blocks
+        self.seed(seed)
+        
+        # Latency bin upper edges (inclusive): <=2s fast, <=5s moderate, slower otherwise
+        self._lat_edges = np.array([2.0, 5.0])
+        self._lat_edges_list = self._lat_edges.tolist()
+        
+        # Initialize Q-function weights: per difficulty, per streak, per (latency, load) pair
+        self._set_weights(np.zeros((3, self.n_actions), dtype=np.float32),
+                          np.zeros((max_streak + 1, self.n_actions), dtype=np.float32),
+                          np.zeros((max_latency_bin + 1, max_load_bin + 1, self.n_actions), dtype=np.float32))
         
         # Track item states
         self.item_states = {}  # item_id -> (difficulty, success_streak, last_latency_bin, last_load_band)
-        self.item_sessions = {}  # item_id -> list of session results
-        
+        self.item_totals = {}  # item_id -> [n_sessions, n_correct, latency_sum, reward_sum]
+        self.item_history = {}  # item_id -> (MAX_HISTORY, 4) ring buffer of recent results
+        self.item_last_action = {}  # item_id -> action chosen by the last get_next_interval
+        
+        # Deferred Q updates, applied together by apply_pending_updates
+        self._transitions = np.empty(64, dtype=TRANSITION_DTYPE)
+        self._n_transitions = 0
+        
+    def seed(self, seed: Optional[int] = None):
+        """Reset the scheduler's random generator (and drop any prefetched draws)"""
+        self.rng = np.random.default_rng(seed)
+        self._explore_pos = RANDOM_BLOCK_SIZE
+    
+    def _next_explore_draw(self) -> Tuple[float, int]:
+        """Next (uniform, random action) pair from the prefetched block"""
+        if self._explore_pos == RANDOM_BLOCK_SIZE:
+            self._explore_uniforms = self.rng.random(RANDOM_BLOCK_SIZE).tolist()
+            self._explore_actions = self.rng.integers(0, self.n_actions, RANDOM_BLOCK_SIZE).tolist()
+            self._explore_pos = 0
+        
+        i = self._explore_pos
+        self._explore_pos += 1
+        return self._explore_uniforms[i], self._explore_actions[i]
+    
+    def _set_weights(self, w_diff: np.ndarray, w_streak: np.ndarray, w_ll: np.ndarray):
+        """Pack the three weight tables into one flat vector, keeping w_* as views into it"""
+        self.weights = np.concatenate([w_diff.ravel(), w_streak.ravel(), w_ll.ravel()]).astype(np.float32)
+        
+        n_diff, n_streak = w_diff.size, w_streak.size
+        self.w_diff = self.weights[:n_diff].reshape(w_diff.shape)
+        self.w_streak = self.weights[n_diff:n_diff + n_streak].reshape(w_streak.shape)
+        self.w_ll = self.weights[n_diff + n_streak:].reshape(w_ll.shape)
+        self.state_dims = (w_diff.shape[0], w_streak.shape[0]) + w_ll.shape[:2]
+        self._row_offsets = (0, n_diff, n_diff + n_streak)
+        self._refresh_best_actions()
+    
+    def _refresh_best_actions(self):
+        """Recompute the greedy action of every state after the weights changed"""
+        self.best_action = self.q_table.argmax(axis=-1).astype(np.int8)
+        self._best_action_stale = False
+    
+    def _feature_bases(self, state_idx: Tuple[int, int, int, int]) -> Tuple[int, int, int]:
+        """Offsets of a state's difficulty, streak and latency/load weight rows in the flat vector"""
+        d_idx, s_idx, l_idx, load_idx = state_idx
+        d_off, s_off, ll_off = self._row_offsets
+        n = self.n_actions
+        return (d_off + d_idx * n,
+                s_off + s_idx * n,
+                ll_off + (l_idx * self.w_ll.shape[1] + load_idx) * n)
+    
+    @property
+    def q_table(self) -> np.ndarray:
+        """Full Q(s,a) table materialized from the weights (for inspection and reporting)"""
+        return (self.w_diff[:, None, None, None, :] +
+                self.w_streak[None, :, None, None, :] +
+                self.w_ll[None, None, :, :, :])
+    
     def get_state_index(self, difficulty: int, success_streak: int, 
                        latency_bin: int, load_band: int) -> Tuple[int, int, int, int]:
         """Convert state components to Q-table indices"""
@@ -55,75 +305,43 @@ class QLearningScheduler:
     
     def get_latency_bin(self, latency_sec: float) -> int:
         """Convert latency to bin index"""
-        if latency_sec <= 2.0:
-            return 0
-        elif latency_sec <= 5.0:
-            return 1
-        else:
-            return 2
+        return bisect_left(self._lat_edges_list, latency_sec)
+    
+    def get_latency_bins(self, latencies: np.ndarray) -> np.ndarray:
+        """Vectorized get_latency_bin for a whole array of latencies"""
+        return np.searchsorted(self._lat_edges, latencies, side='left')
     
     def get_load_band_index(self, load_band: str) -> int:
         """Convert load band string to index"""
-        band_map = {'low': 1, 'moderate': 2, 'high': 3}
-        return band_map.get(load_band, 2)
+        return LOAD_BAND_INDEX.get(load_band, 2)
     
     def choose_action(self, state: Tuple[int, int, int, int], 
                      item_id: int, force_exploit: bool = False) -> int:
         """Choose action using epsilon-greedy policy with safety constraints"""
         state_idx = self.get_state_index(*state)
         
-        if not force_exploit and np.random.random() < self.epsilon:
+        explore = False
+        if not force_exploit:
+            uniform, random_action = self._next_explore_draw()
+            explore = uniform < self.epsilon
+        
+        if explore:
             # Explore: choose random action
-            action = np.random.randint(0, self.n_actions)
+            action = random_action
         else:
-            # Exploit: choose best action
-            action = np.argmax(self.q_table[state_idx])
+            # Exploit: choose best action from the cached greedy table
+            if self._best_action_stale:
+                self._refresh_best_actions()
+            action = int(self.best_action[state_idx])
         
         # Apply safety constraints
-        difficulty, success_streak, latency_bin, load_band = state
-        
-        # Don't use very long intervals for difficult items or high load
-        if difficulty >= 3 or load_band == 'high':
-            action = min(action, 2)  # Max 2 minutes
-        
-        # Don't use very short intervals for easy items with good streak
-        if difficulty == 1 and success_streak >= 2 and load_band in ['low', 'moderate']:
-            action = max(action, 1)  # Min 1 minute
-        
-        return action
+        difficulty, success_streak, _, load_band = state
+        return int(_safe_action(action, difficulty, success_streak, load_band))
     
     def calculate_reward(self, correct: bool, latency_sec: float, 
                         difficulty: int, load_band: str) -> float:
         """Calculate reward for an action"""
-        if correct:
-            # Base reward for correct answer
-            reward = 1.0
-            
-            # Bonus for faster response (up to 0.5 bonus)
-            if latency_sec <= 2.0:
-                reward += 0.5
-            elif latency_sec <= 5.0:
-                reward += 0.3
-            elif latency_sec <= 10.0:
-                reward += 0.1
-            
-            # Bonus for handling difficult items
-            if difficulty >= 3:
-                reward += 0.2
-            
-            # Bonus for handling high load situations
-            if load_band == 'high':
-                reward += 0.2
-                
-        else:
-            # Penalty for incorrect answer
-            reward = -0.5
-            
-            # Extra penalty for easy items
-            if difficulty == 1:
-                reward -= 0.3
-        
-        return reward
+        return float(_reward(correct, latency_sec, difficulty, load_band == 'high'))
     
     def update_q_value(self, state: Tuple[int, int, int, int], 
                       action: int, reward: float, 
@@ -133,39 +351,43 @@ class QLearningScheduler:
         next_state_idx = self.get_state_index(*next_state)
         
         # Q-learning update: Q(s,a) = (1-α)Q(s,a) + α[r + γ*max_a'Q(s',a')]
-        current_q = self.q_table[state_idx + (action,)]
-        max_next_q = np.max(self.q_table[next_state_idx])
-        
-        new_q = current_q + self.learning_rate * (reward + self.discount_factor * max_next_q - current_q)
-        self.q_table[state_idx + (action,)] = new_q
+        _update_q(self.weights, *self._feature_bases(state_idx), action, reward,
+                  *self._feature_bases(next_state_idx), self.n_actions,
+                  self.learning_rate, self.discount_factor)
+        # Each weight is shared by many states, so refresh lazily on the next greedy lookup
+        self._best_action_stale = True
     
     def get_next_interval(self, item_id: int, difficulty: int, 
                          load_band: str, force_exploit: bool = False) -> int:
         """Get next review interval for an item"""
         # Get current state
-        if item_id not in self.item_states:
+        state = self.item_states.get(item_id)
+        if state is None:
             # Initialize new item
             state = (difficulty, 0, 1, self.get_load_band_index(load_band))
             self.item_states[item_id] = state
-            self.item_sessions[item_id] = []
-        else:
-            state = self.item_states[item_id]
+            self._init_item_records(item_id)
         
-        # Choose action
+        # Choose action and remember it for the Q update in record_result
         action = self.choose_action(state, item_id, force_exploit)
+        self.item_last_action[item_id] = action
         interval = self.actions[action]
         
         return interval
     
     def record_result(self, item_id: int, correct: bool, latency_sec: float,
-                     difficulty: int, load_band: str):
-        """Record the result of a memory session"""
-        if item_id not in self.item_states:
-            return
+                     difficulty: int, load_band: str, defer_update: bool = False,
+                     latency_bin: Optional[int] = None):
+        """Record the result of a memory session
         
+        With defer_update the Q update is buffered until apply_pending_updates.
+        latency_bin may be passed when the caller has already binned latencies in bulk.
+        """
         # Get current state
-        current_state = self.item_states[item_id]
-        difficulty, success_streak, latency_bin, load_band_idx = current_state
+        current_state = self.item_states.get(item_id)
+        if current_state is None:
+            return
+        difficulty, success_streak, _, _ = current_state
         
         # Calculate reward
         reward = self.calculate_reward(correct, latency_sec, difficulty, load_band)
@@ -177,44 +399,82 @@ class QLearningScheduler:
             new_streak = 0
         
         # Update latency bin
-        new_latency_bin = self.get_latency_bin(latency_sec)
+        new_latency_bin = self.get_latency_bin(latency_sec) if latency_bin is None else latency_bin
         
         # New state
         new_state = (difficulty, new_streak, new_latency_bin, self.get_load_band_index(load_band))
         
-        # Update Q-value
-        # Find the action that was taken (this is a simplification)
-        # In practice, you'd track the action taken
-        action = 0  # Default to first action for now
-        self.update_q_value(current_state, action, reward, new_state)
+        # Update Q-value for the action that scheduled this review
+        action = self.item_last_action.get(item_id)
+        if action is None:
+            # No interval was handed out since loading; assume the greedy choice
+            action = self.choose_action(current_state, item_id, force_exploit=True)
+        
+        if defer_update:
+            self._buffer_transition(current_state, action, reward, new_state)
+        else:
+            self.update_q_value(current_state, action, reward, new_state)
         
         # Update item state
         self.item_states[item_id] = new_state
         
         # Record session
-        session_data = {
-            'correct': correct,
-            'latency_sec': latency_sec,
-            'reward': reward,
-            'old_state': current_state,
-            'new_state': new_state
-        }
-        self.item_sessions[item_id].append(session_data)
+        self._record_session(item_id, correct, latency_sec, reward, action)
+    
+    def _init_item_records(self, item_id: int):
+        """Start empty totals and history for an item"""
+        self.item_totals[item_id] = [0, 0, 0.0, 0.0]
+        self.item_history[item_id] = np.zeros((MAX_HISTORY, 4), dtype=np.float32)
+    
+    def _record_session(self, item_id: int, correct: bool, latency_sec: float,
+                        reward: float, action: int):
+        """Add a result to the item's running totals and ring buffer"""
+        totals = self.item_totals[item_id]
+        self.item_history[item_id][totals[0] % MAX_HISTORY] = (correct, latency_sec, reward, action)
+        totals[0] += 1
+        totals[1] += int(correct)
+        totals[2] += latency_sec
+        totals[3] += reward
+    
+    def _buffer_transition(self, state: Tuple[int, int, int, int], action: int,
+                           reward: float, next_state: Tuple[int, int, int, int]):
+        """Queue a transition for the next batched Q update"""
+        if self._n_transitions == len(self._transitions):
+            self._transitions = np.resize(self._transitions, 2 * len(self._transitions))
+        
+        row = self._transitions[self._n_transitions]
+        row['bases'] = self._feature_bases(self.get_state_index(*state))
+        row['action'] = action
+        row['reward'] = reward
+        row['next_bases'] = self._feature_bases(self.get_state_index(*next_state))
+        self._n_transitions += 1
+    
+    def apply_pending_updates(self):
+        """Apply all buffered transitions to the Q-function in a single kernel call"""
+        if self._n_transitions == 0:
+            return
+        
+        pending = self._transitions[:self._n_transitions]
+        _replay_updates(self.weights,
+                        np.ascontiguousarray(pending['bases']),
+                        np.ascontiguousarray(pending['action']),
+                        np.ascontiguousarray(pending['reward']),
+                        np.ascontiguousarray(pending['next_bases']),
+                        self._n_transitions, self.n_actions,
+                        self.learning_rate, self.discount_factor)
+        self._n_transitions = 0
+        self._best_action_stale = True
     
     def get_item_statistics(self, item_id: int) -> Dict:
         """Get statistics for a specific item"""
-        if item_id not in self.item_sessions:
+        totals = self.item_totals.get(item_id)
+        if not totals or totals[0] == 0:
             return {}
         
-        sessions = self.item_sessions[item_id]
-        if not sessions:
-            return {}
-        
-        total_sessions = len(sessions)
-        correct_sessions = sum(1 for s in sessions if s['correct'])
+        total_sessions, correct_sessions, latency_sum, reward_sum = totals
         accuracy = correct_sessions / total_sessions
-        avg_latency = np.mean([s['latency_sec'] for s in sessions])
-        avg_reward = np.mean([s['reward'] for s in sessions])
+        avg_latency = latency_sum / total_sessions
+        avg_reward = reward_sum / total_sessions
         
         return {
             'total_sessions': total_sessions,
@@ -225,33 +485,69 @@ class QLearningScheduler:
         }
     
     def save_model(self, filepath: str):
-        """Save Q-table and item states"""
-        model_data = {
-            'q_table': self.q_table.tolist(),
-            'item_states': {str(k): v for k, v in self.item_states.items()},
-            'item_sessions': {str(k): v for k, v in self.item_sessions.items()},
-            'hyperparameters': {
-                'learning_rate': self.learning_rate,
-                'discount_factor': self.discount_factor,
-                'epsilon': self.epsilon,
-                'max_streak': self.max_streak,
-                'max_latency_bin': self.max_latency_bin,
-                'max_load_bin': self.max_load_bin
-            }
-        }
-        
+        """Save Q-function weights, item states, item records and hyperparameters to a .npz file"""
+        item_ids = list(self.item_states.keys())
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as f:
-            json.dump(model_data, f, indent=2)
+        np.savez_compressed(
+            filepath,
+            w_diff=self.w_diff,
+            w_streak=self.w_streak,
+            w_ll=self.w_ll,
+            item_states_keys=np.array(item_ids, dtype=np.int64),
+            item_states_vals=np.array([self.item_states[k] for k in item_ids], dtype=np.uint8).reshape(-1, 4),
+            item_totals=np.array([self.item_totals[k] for k in item_ids], dtype=np.float64).reshape(-1, 4),
+            item_history=np.array([self.item_history[k] for k in item_ids], dtype=np.float32).reshape(-1, MAX_HISTORY, 4),
+            hparams=np.array([self.learning_rate, self.discount_factor, self.epsilon,
+                              self.max_streak, self.max_latency_bin, self.max_load_bin])
+        )
     
     def load_model(self, filepath: str):
-        """Load Q-table and item states"""
-        with open(filepath, 'r') as f:
-            model_data = json.load(f)
+        """Load Q-function weights, item states and hyperparameters"""
+        if filepath.endswith('.json'):
+            self._load_json_model(filepath)
+            return
         
-        self.q_table = np.array(model_data['q_table'])
+        with np.load(filepath, allow_pickle=False) as data:
+            self._set_weights(data['w_diff'], data['w_streak'], data['w_ll'])
+            item_ids = data['item_states_keys'].tolist()
+            self.item_states = {k: tuple(v) for k, v in zip(item_ids, data['item_states_vals'].tolist())}
+            self.item_totals = {k: [int(v[0]), int(v[1]), v[2], v[3]]
+                                for k, v in zip(item_ids, data['item_totals'].tolist())}
+            self.item_history = {k: history.copy() for k, history in zip(item_ids, data['item_history'])}
+            hparams = data['hparams']
+        
+        self.learning_rate, self.discount_factor, self.epsilon = (float(x) for x in hparams[:3])
+        self.max_streak, self.max_latency_bin, self.max_load_bin = (int(x) for x in hparams[3:6])
+    
+    def _load_json_model(self, filepath: str):
+        """Load a model saved by older versions as a single JSON file"""
+        with open(filepath, 'rb') as f:
+            model_data = orjson.loads(f.read())
+        
+        if 'q_table' in model_data:
+            # Older models stored a full table; keep its main effects
+            q = np.array(model_data['q_table'])
+            mean_q = q.mean(axis=(0, 1, 2, 3))
+            self._set_weights(q.mean(axis=(1, 2, 3)) - mean_q,
+                              q.mean(axis=(0, 2, 3)) - mean_q,
+                              q.mean(axis=(0, 1)))
+        else:
+            self._set_weights(np.array(model_data['w_diff']),
+                              np.array(model_data['w_streak']),
+                              np.array(model_data['w_ll']))
         self.item_states = {int(k): tuple(v) for k, v in model_data['item_states'].items()}
-        self.item_sessions = {int(k): v for k, v in model_data['item_sessions'].items()}
+        
+        # Fold the stored per-session lists into totals and recent history (action unknown: -1)
+        self.item_totals, self.item_history = {}, {}
+        for item_id in self.item_states:
+            self._init_item_records(item_id)
+        for k, sessions in model_data['item_sessions'].items():
+            item_id = int(k)
+            if item_id not in self.item_totals:
+                self._init_item_records(item_id)
+            for session in sessions:
+                self._record_session(item_id, session['correct'], session['latency_sec'],
+                                     session['reward'], -1)
         
         hyperparams = model_data['hyperparameters']
         self.learning_rate = hyperparams['learning_rate']
@@ -263,55 +559,79 @@ class QLearningScheduler:
 
 def simulate_memory_sessions(scheduler: QLearningScheduler, 
                            memory_items: pd.DataFrame,
-                           n_sessions: int = 40) -> pd.DataFrame:
-    """Simulate memory sessions for evaluation"""
-    results = []
+                           n_sessions: int = 40,
+                           seed: Optional[int] = None) -> pd.DataFrame:
+    """Simulate memory sessions for evaluation (pass seed for a reproducible run)"""
+    if seed is not None:
+        scheduler.seed(seed)
+    rng = scheduler.rng
     
-    for session in range(n_sessions):
-        # Randomly select items for this session
-        n_items = min(12, len(memory_items))  # Max 12 items per session
-        session_items = memory_items.sample(n=n_items)
-        
-        session_accuracy = 0
-        session_latency = 0
-        session_load_band = np.random.choice(['low', 'moderate', 'high'], p=[0.4, 0.4, 0.2])
-        
-        for _, item in session_items.iterrows():
-            item_id = item['item_id']
-            difficulty = item['difficulty']
-            
-            # Get next interval (simplified - in practice this would be based on scheduling)
-            interval = scheduler.get_next_interval(item_id, difficulty, session_load_band)
-            
-            # Simulate response (simplified)
-            # Higher difficulty and load = lower accuracy, higher latency
-            base_accuracy = 0.9 - (difficulty - 1) * 0.15 - (0.1 if session_load_band == 'high' else 0)
-            accuracy = max(0.3, min(0.95, base_accuracy + np.random.normal(0, 0.1)))
-            correct = np.random.random() < accuracy
-            
-            # Simulate latency
-            base_latency = 2.0 + (difficulty - 1) * 1.5 + (1.0 if session_load_band == 'high' else 0)
-            latency = max(0.5, base_latency + np.random.normal(0, 0.5))
-            
-            # Record result
-            scheduler.record_result(item_id, correct, latency, difficulty, session_load_band)
-            
-            session_accuracy += (1 if correct else 0)
-            session_latency += latency
-        
-        # Calculate session metrics
-        session_accuracy /= n_items
-        session_latency /= n_items
-        
-        results.append({
-            'session': session + 1,
-            'accuracy': session_accuracy,
-            'avg_latency': session_latency,
-            'load_band': session_load_band,
-            'n_items': n_items
-        })
-    
-    return pd.DataFrame(results)
+    # Pull item columns out of pandas once; sessions index into them
+    all_item_ids = memory_items['item_id'].to_numpy()
+    all_difficulties = memory_items['difficulty'].to_numpy()
+    n_items = min(12, len(all_item_ids))  # Max 12 items per session
+    
+    # Draw every session's randomness up front so the scheduler loop can run compiled
+    session_rows = rng.random((n_sessions, len(all_item_ids))).argsort(axis=1)[:, :n_items]
+    session_load = rng.choice(np.array([1, 2, 3]), size=n_sessions, p=[0.4, 0.4, 0.2])
+    high_load = (session_load == 3)[:, np.newaxis]
+    difficulties = all_difficulties[session_rows]
+    
+    # Simulate responses (simplified)
+    # Higher difficulty and load = lower accuracy, higher latency
+    base_accuracy = 0.9 - (difficulties - 1) * 0.15 - np.where(high_load, 0.1, 0.0)
+    accuracy = np.clip(base_accuracy + rng.normal(0, 0.1, difficulties.shape), 0.3, 0.95)
+    correct = rng.random(difficulties.shape) < accuracy
+    
+    base_latency = 2.0 + (difficulties - 1) * 1.5 + np.where(high_load, 1.0, 0.0)
+    latency = np.maximum(0.5, base_latency + rng.normal(0, 0.5, difficulties.shape))
+    latency_bins = scheduler.get_latency_bins(latency)
+    
+    explore_uniforms = rng.random(difficulties.shape)
+    explore_actions = rng.integers(0, scheduler.n_actions, difficulties.shape)
+    
+    # Scheduler records for the items involved, one row per memory item
+    item_keys = all_item_ids.tolist()
+    states = np.zeros((len(item_keys), 4), dtype=np.int64)
+    last_action = np.full(len(item_keys), -1, dtype=np.int64)
+    totals = np.zeros((len(item_keys), 4), dtype=np.float64)
+    history = np.zeros((len(item_keys), MAX_HISTORY, 4), dtype=np.float32)
+    for row, item_id in enumerate(item_keys):
+        if item_id in scheduler.item_states:
+            states[row] = scheduler.item_states[item_id]
+            last_action[row] = scheduler.item_last_action.get(item_id, -1)
+            totals[row] = scheduler.item_totals[item_id]
+            history[row] = scheduler.item_history[item_id]
+    
+    _simulate_sessions(scheduler.weights, np.array(scheduler._row_offsets, dtype=np.int64),
+                       scheduler.w_ll.shape[1], scheduler.n_actions, scheduler.max_streak,
+                       scheduler.max_latency_bin, scheduler.max_load_bin,
+                       scheduler.learning_rate, scheduler.discount_factor, scheduler.epsilon,
+                       states, last_action, totals, history,
+                       session_rows, session_load, all_difficulties.astype(np.int64),
+                       correct, latency, latency_bins, explore_uniforms, explore_actions)
+    scheduler._best_action_stale = True
+    
+    # Copy the updated records back for every item that has now been seen
+    for row in np.flatnonzero(states[:, 0]).tolist():
+        item_id = item_keys[row]
+        scheduler.item_states[item_id] = tuple(states[row].tolist())
+        scheduler.item_last_action[item_id] = int(last_action[row])
+        n, n_correct, latency_sum, reward_sum = totals[row].tolist()
+        scheduler.item_totals[item_id] = [int(n), int(n_correct), latency_sum, reward_sum]
+        scheduler.item_history[item_id] = history[row]
+    
+    # Session metrics
+    band_names = np.array(['', 'low', 'moderate', 'high'])
+    results = pd.DataFrame({
+        'session': np.arange(1, n_sessions + 1),
+        'accuracy': correct.sum(axis=1) / n_items,
+        'avg_latency': latency.mean(axis=1),
+        'load_band': band_names[session_load],
+        'n_items': n_items
+    })
+    
+    return results
 
 if __name__ == "__main__":
     # Load memory items
@@ -328,7 +648,7 @@ if __name__ == "__main__":
     results.to_csv('outputs/session_results.csv', index=False)
     
     # Save model
-    scheduler.save_model('outputs/qlearning_model.json')
+    scheduler.save_model('outputs/qlearning_model.npz')
     
     print("Q-Learning Simulation Complete!")
     print(f"Final accuracy: {results['accuracy'].iloc[-1]:.3f}")
@@ -4,11 +4,12 @@ PostgreSQL database integration with SQLAlchemy
 """
 
 import os
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from typing import List, Optional, Dict, Any
-from sqlalchemy import create_engine, Column, String, Integer, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey
+from sqlalchemy import create_engine, select, insert, Column, String, Integer, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
@@ -19,7 +20,7 @@ if DATABASE_URL.startswith('postgres://'):
     DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
 
 # Create engine
-engine = create_engine(DATABASE_URL, echo=False)
+engine = create_engine(DATABASE_URL, echo=False, pool_pre_ping=True)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -34,8 +35,8 @@ class User(Base):
     date_of_birth = Column(Date)
     emergency_contact_name = Column(String(255))
     emergency_contact_phone = Column(String(20))
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 class Task(Base):
     __tablename__ = "tasks"
@@ -50,8 +51,13 @@ class Task(Base):
     is_completed = Column(Boolean, default=False)
     completed_at = Column(DateTime)
     reminder_time = Column(DateTime)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    # Serves get_user_tasks (filter by user and completion, ordered by due date)
+    __table_args__ = (
+        Index('ix_tasks_user_completed_due', 'user_id', 'is_completed', 'due_date'),
+    )
 
 class UserProgress(Base):
     __tablename__ = "user_progress"
@@ -62,7 +68,12 @@ class UserProgress(Base):
     metric_value = Column(Float, nullable=False)
     measurement_date = Column(Date, nullable=False)
     notes = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    
+    # Serves get_user_progress (per-user, per-metric date ranges, newest first)
+    __table_args__ = (
+        Index('ix_progress_user_metric_date', 'user_id', 'metric_name', measurement_date.desc()),
+    )
 
 # Database utility functions
 def get_db() -> Session:
@@ -91,10 +102,10 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
 
 def get_user_tasks(db: Session, user_id: str, completed: bool = None) -> List[Task]:
     """Get user tasks with optional completion filter"""
-    query = db.query(Task).filter(Task.user_id == user_id)
+    stmt = select(Task).where(Task.user_id == user_id)
     if completed is not None:
-        query = query.filter(Task.is_completed == completed)
-    return query.order_by(Task.due_date).all()
+        stmt = stmt.where(Task.is_completed == completed)
+    return list(db.execute(stmt.order_by(Task.due_date)).scalars())
 
 def create_task(db: Session, user_id: str, title: str, task_type: str, 
                 description: str = None, priority: str = "medium", 
@@ -113,16 +124,25 @@ def create_task(db: Session, user_id: str, title: str, task_type: str,
     db.refresh(task)
     return task
 
+def bulk_create_tasks(db: Session, task_dicts: List[Dict[str, Any]]) -> int:
+    """Create many tasks in one batched INSERT (no per-row refresh)"""
+    if not task_dicts:
+        return 0
+    db.execute(insert(Task), task_dicts)
+    db.commit()
+    return len(task_dicts)
+
 def get_user_progress(db: Session, user_id: str, metric_name: str = None, 
                      days: int = 30) -> List[UserProgress]:
     """Get user progress data"""
-    query = db.query(UserProgress).filter(
+    cutoff = date.today() - timedelta(days=days)
+    stmt = select(UserProgress).where(
         UserProgress.user_id == user_id,
-        UserProgress.measurement_date >= date.today() - datetime.timedelta(days=days)
+        UserProgress.measurement_date >= cutoff
     )
     if metric_name:
-        query = query.filter(UserProgress.metric_name == metric_name)
-    return query.order_by(UserProgress.measurement_date.desc()).all()
+        stmt = stmt.where(UserProgress.metric_name == metric_name)
+    return list(db.execute(stmt.order_by(UserProgress.measurement_date.desc())).scalars())
 
 def create_user_progress(db: Session, user_id: str, metric_name: str, 
                         metric_value: float, notes: str = None) -> UserProgress:
@@ -138,3 +158,13 @@ def create_user_progress(db: Session, user_id: str, metric_name: str,
     db.commit()
     db.refresh(progress)
     return progress
+
+def bulk_create_user_progress(db: Session, progress_dicts: List[Dict[str, Any]]) -> int:
+    """Create many progress entries in one batched INSERT (no per-row refresh)"""
+    if not progress_dicts:
+        return 0
+    today = date.today()
+    rows = [{'measurement_date': today, **row} for row in progress_dicts]
+    db.execute(insert(UserProgress), rows)
+    db.commit()
+    return len(rows)
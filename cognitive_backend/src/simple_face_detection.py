@@ -3,6 +3,9 @@ import numpy as np
 import json
 import os
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Optional, Tuple
 import pickle
 from datetime import datetime
@@ -11,6 +14,16 @@ class SimpleFaceDetectionService:
     def __init__(self, data_dir: str = "data/faces"):
         self.data_dir = data_dir
         self.known_faces = {}
+        # 100x100 face templates, one per slot; known_faces entries hold their slot index
+        self._faces_uint8 = np.empty((0, 100, 100), dtype=np.uint8)
+        # Row-normalized face templates for vectorized matching, rebuilt when faces change
+        self._known_ids = []
+        self._known_matrix = np.empty((0, 100 * 100), dtype=np.float32)
+        # blake2b digest of the base64 payload -> detected face boxes, most recent last.
+        # Only the boxes are kept (not the decoded frames); Flask handler threads share it.
+        self._decode_cache = OrderedDict()
+        self._decode_cache_size = 32
+        self._decode_cache_lock = threading.Lock()
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         
         # Create data directory if it doesn't exist
@@ -19,22 +32,59 @@ class SimpleFaceDetectionService:
         # Load existing face data
         self.load_face_data()
     
+    def detect_faces(self, gray: np.ndarray, max_dim: int = 320) -> np.ndarray:
+        """
+        Run the Haar cascade on a downscaled copy and return boxes in original coordinates
+        """
+        scale = max_dim / max(gray.shape[:2])
+        if scale >= 1.0:
+            return self.face_cascade.detectMultiScale(gray, 1.2, 4, minSize=(30, 30))
+        
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = self.face_cascade.detectMultiScale(small, 1.2, 4, minSize=(30, 30))
+        if len(faces) == 0:
+            return faces
+        
+        return np.round(np.asarray(faces) / scale).astype(int)
+    
+    def _decode_and_detect(self, image_data: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decode a base64 image straight to grayscale and detect faces, reusing recent detections
+        """
+        image_bytes = base64.b64decode(image_data)
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        gray = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError("Could not decode image")
+        
+        key = hashlib.blake2b(image_data.encode(), digest_size=8).digest()
+        with self._decode_cache_lock:
+            faces = self._decode_cache.get(key)
+            if faces is not None:
+                self._decode_cache.move_to_end(key)
+                return gray, faces
+        
+        # Detect outside the lock so other requests are not serialized behind the cascade
+        faces = self.detect_faces(gray)
+        # Cached boxes are shared between callers, so keep them read-only
+        if isinstance(faces, np.ndarray):
+            faces.flags.writeable = False
+        
+        with self._decode_cache_lock:
+            self._decode_cache[key] = faces
+            self._decode_cache.move_to_end(key)
+            if len(self._decode_cache) > self._decode_cache_size:
+                self._decode_cache.popitem(last=False)
+        return gray, faces
+    
     def register_face(self, image_data: str, person_name: str, relationship: str, 
                      additional_info: str = "") -> Dict:
         """
         Register a new face for detection (simplified version)
         """
         try:
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            # Convert to grayscale for face detection
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+            # Decode and detect (cached per image)
+            gray, faces = self._decode_and_detect(image_data)
             
             if len(faces) == 0:
                 return {
@@ -59,16 +109,18 @@ class SimpleFaceDetectionService:
             
             # Store face data
             face_id = f"{person_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            self._faces_uint8 = np.concatenate([self._faces_uint8, face_resized[np.newaxis]])
             self.known_faces[face_id] = {
                 "name": person_name,
                 "relationship": relationship,
                 "additional_info": additional_info,
-                "face_data": face_resized.tolist(),
+                "slot": len(self._faces_uint8) - 1,
                 "face_location": [int(y), int(x+w), int(y+h), int(x)],  # top, right, bottom, left
                 "registered_at": datetime.now().isoformat()
             }
             
             # Save face data
+            self._rebuild_known_matrix()
             self.save_face_data()
             
             return {
@@ -91,16 +143,8 @@ class SimpleFaceDetectionService:
         Recognize faces in the given image (simplified version)
         """
         try:
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+            # Decode and detect (cached per image)
+            gray, faces = self._decode_and_detect(image_data)
             
             if len(faces) == 0:
                 return {
@@ -114,17 +158,18 @@ class SimpleFaceDetectionService:
                 face_region = gray[y:y+h, x:x+w]
                 face_resized = cv2.resize(face_region, (100, 100))
                 
-                # Compare with known faces
+                # Compare with all known faces at once
                 best_match = None
                 best_similarity = 0
                 
-                for face_id, face_data in self.known_faces.items():
-                    known_face = np.array(face_data["face_data"])
-                    similarity = self.calculate_similarity(face_resized, known_face)
+                if self._known_ids:
+                    similarities = self._known_matrix @ self._normalize_template(face_resized)
+                    best = int(similarities.argmax())
                     
-                    if similarity > best_similarity and similarity > tolerance:
-                        best_similarity = similarity
-                        best_match = face_data
+                    if similarities[best] > max(best_similarity, tolerance):
+                        best_similarity = float(similarities[best])
+                        face_id = self._known_ids[best]
+                        best_match = self.known_faces[face_id]
                 
                 if best_match:
                     results.append({
@@ -162,16 +207,8 @@ class SimpleFaceDetectionService:
         Get face landmarks for visualization (simplified version)
         """
         try:
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+            # Decode and detect (cached per image)
+            gray, faces = self._decode_and_detect(image_data)
             
             if len(faces) == 0:
                 return {
@@ -243,6 +280,7 @@ class SimpleFaceDetectionService:
             
             # Remove from known faces
             del self.known_faces[face_id]
+            self._rebuild_known_matrix()
             
             # Save updated data
             self.save_face_data()
@@ -275,9 +313,38 @@ class SimpleFaceDetectionService:
         except:
             return 0.0
     
+    @staticmethod
+    def _normalize_template(face: np.ndarray) -> np.ndarray:
+        """Flatten, mean-center and L2-normalize a face so a dot product equals TM_CCOEFF_NORMED"""
+        vector = np.asarray(face, dtype=np.float32).reshape(-1)
+        vector = vector - vector.mean()
+        return vector / (np.linalg.norm(vector) + 1e-8)
+    
+    def _rebuild_known_matrix(self):
+        """Stack all known face templates into one normalized matrix"""
+        self._known_ids = list(self.known_faces.keys())
+        if self._known_ids:
+            slots = [self.known_faces[face_id]["slot"] for face_id in self._known_ids]
+            self._known_matrix = np.stack([self._normalize_template(self._faces_uint8[slot])
+                                           for slot in slots])
+        else:
+            self._known_matrix = np.empty((0, 100 * 100), dtype=np.float32)
+    
     def save_face_data(self):
         """Save face data to disk"""
         try:
+            # Compact templates so slots follow metadata order (drops deleted faces)
+            slots = [face_data["slot"] for face_data in self.known_faces.values()]
+            self._faces_uint8 = np.ascontiguousarray(self._faces_uint8[slots], dtype=np.uint8)
+            for slot, face_data in enumerate(self.known_faces.values()):
+                face_data["slot"] = slot
+            
+            # Save templates as raw uint8; replace atomically since the old file may be memory-mapped
+            faces_path = os.path.join(self.data_dir, "faces.npy")
+            tmp_path = faces_path + ".tmp.npy"
+            np.save(tmp_path, self._faces_uint8)
+            os.replace(tmp_path, faces_path)
+            
             # Save face metadata
             with open(os.path.join(self.data_dir, "faces_metadata.json"), "w") as f:
                 json.dump(self.known_faces, f, indent=2)
@@ -293,7 +360,22 @@ class SimpleFaceDetectionService:
             if os.path.exists(metadata_path):
                 with open(metadata_path, "r") as f:
                     self.known_faces = json.load(f)
-                    
+            
+            faces_path = os.path.join(self.data_dir, "faces.npy")
+            if os.path.exists(faces_path):
+                self._faces_uint8 = np.load(faces_path, mmap_mode="r")
+            
+            # Older metadata files carried the templates as nested lists
+            legacy_faces = [face_data for face_data in self.known_faces.values() if "face_data" in face_data]
+            if legacy_faces:
+                templates = [np.asarray(face_data.pop("face_data"), dtype=np.uint8) for face_data in legacy_faces]
+                for i, face_data in enumerate(legacy_faces):
+                    face_data["slot"] = len(self._faces_uint8) + i
+                self._faces_uint8 = np.concatenate([self._faces_uint8, np.stack(templates)])
+                self.save_face_data()
+            
+            self._rebuild_known_matrix()
+                
         except Exception as e:
             print(f"Error loading face data: {e}")
 
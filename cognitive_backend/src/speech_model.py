@@ -5,8 +5,10 @@ Uses NumPy-based ridge regression to predict cognitive load from speech features
 
 import numpy as np
 import pandas as pd
+import scipy.linalg
+from scipy.linalg.blas import get_blas_funcs
 from typing import Tuple, List, Dict
-import json
+import orjson
 import os
 
 class SpeechBiomarkerModel:
@@ -17,33 +19,60 @@ class SpeechBiomarkerModel:
     def __init__(self, lambda_reg: float = 0.01):
         self.lambda_reg = lambda_reg
         self.coefficients = None
+        self._predict_scalar = None
         self.feature_names = ['wpm', 'pause_rate', 'ttr', 'jitter', 'articulation_rate']
         self.load_bands = {1: 'low', 2: 'moderate', 3: 'high'}
         
     def prepare_features(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare features and target for training"""
-        X = df[self.feature_names].values
-        y = df['cognitive_load'].values
+        """Prepare features and target for training (the bias is handled in train)"""
+        # float32 is plenty for noisy speech features and a 1-3 load target
+        X = df[self.feature_names].to_numpy(dtype=np.float32, copy=False)
+        y = df['cognitive_load'].to_numpy(dtype=np.float32, copy=False)
         
-        # Add bias term
-        X_with_bias = np.column_stack([np.ones(X.shape[0]), X])
-        
-        return X_with_bias, y
+        return X, y
+    
+    def _normal_equations(self, X: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """A^T A (upper triangle filled) and A^T y for the design A = [1, X], without materializing A"""
+        # A^T A = [[n, colsum], [colsum^T, X^T X]] and A^T y = [sum(y), X^T y]
+        Xt = X.T
+        n, d = X.shape
+        col_sums = X.sum(axis=0)
+        XtX = np.empty((d + 1, d + 1), dtype=X.dtype)
+        XtX[0, 0] = n
+        XtX[0, 1:] = col_sums
+        XtX[1:, 0] = col_sums
+        # syrk (ssyrk for float32) fills only the upper triangle of X^T X, which is all the
+        # solvers read; hand it whichever of X / X^T is Fortran-ordered to avoid a copy
+        syrk = get_blas_funcs('syrk', (X,))
+        if X.flags.f_contiguous:
+            XtX[1:, 1:] = syrk(1.0, X, trans=1)
+        else:
+            XtX[1:, 1:] = syrk(1.0, Xt, trans=0)
+        Xty = np.concatenate([[y.sum()], Xt @ y]).astype(X.dtype)
+        return XtX, Xty
+    
+    @staticmethod
+    def _fit_metrics(X: np.ndarray, y: np.ndarray, coefficients: np.ndarray) -> Tuple[float, float]:
+        """MSE and R² from one residual vector (sums of squares as dot products)"""
+        residuals = y - (coefficients[0] + X @ coefficients[1:])
+        ssr = float(residuals @ residuals)
+        y_centered = y - y.mean()
+        sst = float(y_centered @ y_centered)
+        return ssr / len(y), 1.0 - ssr / sst
     
     def train(self, df: pd.DataFrame) -> Dict:
         """Train the ridge regression model using normal equation"""
         X, y = self.prepare_features(df)
         
-        # Ridge regression: β = (X^T X + λI)^-1 X^T y
-        XtX = X.T @ X
-        XtX_reg = XtX + self.lambda_reg * np.eye(XtX.shape[0])
-        XtX_inv = np.linalg.inv(XtX_reg)
-        self.coefficients = XtX_inv @ X.T @ y
+        # Ridge regression on [1, X]: solve (A^T A + λI) β = A^T y via Cholesky (A^T A + λI is SPD)
+        XtX, Xty = self._normal_equations(X, y)
+        XtX_reg = XtX + self.lambda_reg * np.eye(XtX.shape[0], dtype=X.dtype)
+        c, low = scipy.linalg.cho_factor(XtX_reg, lower=False, overwrite_a=True, check_finite=False)
+        self.coefficients = scipy.linalg.cho_solve((c, low), Xty, check_finite=False)
+        self._compile_predictor()
         
         # Calculate training metrics
-        predictions = X @ self.coefficients
-        mse = np.mean((y - predictions) ** 2)
-        r2 = 1 - (np.sum((y - predictions) ** 2) / np.sum((y - np.mean(y)) ** 2))
+        mse, r2 = self._fit_metrics(X, y, self.coefficients)
         
         return {
             'mse': mse,
@@ -52,23 +81,42 @@ class SpeechBiomarkerModel:
             'feature_names': ['bias'] + self.feature_names
         }
     
+    def _fit_eig(self, X: np.ndarray, y: np.ndarray):
+        """Cache the eigendecomposition A^T A = V diag(w) V^T and V^T A^T y for λ sweeps"""
+        XtX, Xty = self._normal_equations(X, y)
+        w, V = np.linalg.eigh(XtX, UPLO='U')
+        self._eig = (w, V, V.T @ Xty)
+    
+    def _coef_for_lambda(self, lambda_reg: float) -> np.ndarray:
+        """Ridge coefficients for any λ from the cached eigendecomposition, in O(d²)"""
+        w, V, Vty = self._eig
+        return V @ (Vty / (w + lambda_reg))
+    
+    def regularization_path(self, df: pd.DataFrame, lambdas: List[float]) -> List[Dict]:
+        """Fit metrics and coefficients for each λ, sharing one O(d³) decomposition"""
+        X, y = self.prepare_features(df)
+        self._fit_eig(X, y)
+        
+        path = []
+        for lambda_reg in lambdas:
+            coefficients = self._coef_for_lambda(lambda_reg)
+            mse, r2 = self._fit_metrics(X, y, coefficients)
+            path.append({
+                'lambda_reg': lambda_reg,
+                'mse': mse,
+                'r2': r2,
+                'coefficients': coefficients.tolist()
+            })
+        
+        return path
+    
     def predict_load_band(self, features: Dict[str, float]) -> str:
         """Predict cognitive load band from speech features"""
         if self.coefficients is None:
             raise ValueError("Model must be trained before making predictions")
         
-        # Prepare feature vector
-        feature_vector = np.array([
-            1.0,  # bias term
-            features.get('wpm', 0),
-            features.get('pause_rate', 0),
-            features.get('ttr', 0),
-            features.get('jitter', 0),
-            features.get('articulation_rate', 0)
-        ])
-        
         # Predict cognitive load
-        predicted_load = feature_vector @ self.coefficients
+        predicted_load = self._predict_scalar(features)
         
         # Convert to load band
         if predicted_load <= 1.5:
@@ -78,52 +126,101 @@ class SpeechBiomarkerModel:
         else:
             return 'high'
     
+    def _compile_predictor(self):
+        """Specialize the single-sample predictor for the current coefficients
+        
+        Generates bias + w0*f.get('wpm', 0) + ... with the weights as literals, so a
+        prediction is a handful of float ops instead of building and dotting an array.
+        """
+        terms = [repr(float(self.coefficients[0]))]
+        for name, weight in zip(self.feature_names, self.coefficients[1:].tolist()):
+            terms.append(f"{weight!r} * f.get({name!r}, 0)")
+        
+        namespace = {}
+        exec("def predict(f):\n    return " + " + ".join(terms), namespace)
+        self._predict_scalar = namespace['predict']
+    
     def predict_batch(self, features_list: List[Dict[str, float]]) -> List[str]:
         """Predict load bands for multiple feature sets"""
-        return [self.predict_load_band(features) for features in features_list]
+        X = np.array([[features.get(name, 0) for name in self.feature_names] for features in features_list],
+                     dtype=np.float64).reshape(-1, len(self.feature_names))
+        return self.predict_batch_arr(X).tolist()
+    
+    def predict_batch_arr(self, X: np.ndarray) -> np.ndarray:
+        """Predict load bands for an (N, n_features) matrix in feature_names order"""
+        if self.coefficients is None:
+            raise ValueError("Model must be trained before making predictions")
+        
+        scores = self.coefficients[0] + X @ self.coefficients[1:]
+        # right=True keeps the <= 1.5 / <= 2.5 boundaries of predict_load_band
+        return np.array(['low', 'moderate', 'high'])[np.digitize(scores, [1.5, 2.5], right=True)]
     
     def save_model(self, filepath: str):
-        """Save model to file"""
+        """Save model metadata to a JSON file and the coefficients to a .npy file beside it"""
         model_data = {
-            'coefficients': self.coefficients.tolist(),
             'feature_names': self.feature_names,
             'lambda_reg': self.lambda_reg,
             'load_bands': self.load_bands
         }
         
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as f:
-            json.dump(model_data, f, indent=2)
+        # Replace atomically: a running API may have the old file memory-mapped
+        coefficients_path = self._coefficients_path(filepath)
+        tmp_path = coefficients_path + ".tmp.npy"
+        np.save(tmp_path, self.coefficients)
+        os.replace(tmp_path, coefficients_path)
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(model_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    
+    @staticmethod
+    def _coefficients_path(filepath: str) -> str:
+        """Path of the coefficient array saved alongside a model's metadata file"""
+        return os.path.splitext(filepath)[0] + '.npy'
     
     def load_model(self, filepath: str):
         """Load model from file"""
-        with open(filepath, 'r') as f:
-            model_data = json.load(f)
+        with open(filepath, 'rb') as f:
+            model_data = orjson.loads(f.read())
         
-        self.coefficients = np.array(model_data['coefficients'])
+        if 'coefficients' in model_data:
+            # Older models kept the coefficients inline in the JSON
+            self.coefficients = np.array(model_data['coefficients'])
+        else:
+            coefficients_path = self._coefficients_path(filepath)
+            if not os.path.exists(coefficients_path):
+                raise FileNotFoundError(
+                    f"Model {filepath} has no coefficients file; expected {coefficients_path} beside it (retrain to regenerate)")
+            # Memory-mapped: forked API workers share the pages instead of copying them
+            self.coefficients = np.load(coefficients_path, mmap_mode='r')
         self.feature_names = model_data['feature_names']
         self.lambda_reg = model_data['lambda_reg']
         self.load_bands = model_data['load_bands']
+        self._compile_predictor()
 
 def train_speech_model(data_path: str, output_path: str) -> Dict:
     """Train speech biomarker model and save results"""
-    # Load data
-    df = pd.read_csv(data_path)
+    model = SpeechBiomarkerModel()
+    
+    # Load data: only the columns we use, features parsed straight to float32
+    df = pd.read_csv(data_path,
+                     usecols=model.feature_names + ['cognitive_load', 'date'],
+                     dtype={name: np.float32 for name in model.feature_names},
+                     engine='c')
     
     # Train model
-    model = SpeechBiomarkerModel()
     metrics = model.train(df)
     
     # Save model
     model.save_model(output_path)
     
     # Generate predictions for analysis
-    predictions = model.predict_batch(df[model.feature_names].to_dict('records'))
+    predictions = model.predict_batch_arr(df[model.feature_names].to_numpy(dtype=np.float32))
     df['predicted_load_band'] = predictions
     
-    # Save predictions
-    predictions_df = df[['date', 'cognitive_load', 'predicted_load_band'] + model.feature_names].copy()
-    predictions_df.to_csv(output_path.replace('.json', '_predictions.csv'), index=False)
+    # Save predictions (select columns in the writer rather than copying a subset frame)
+    df.to_csv(output_path.replace('.json', '_predictions.csv'),
+              columns=['date', 'cognitive_load', 'predicted_load_band'] + model.feature_names,
+              index=False)
     
     return metrics
 
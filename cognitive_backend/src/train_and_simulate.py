@@ -5,8 +5,12 @@ Trains speech model, runs Q-learning simulation, and generates reports
 
 import os
 import sys
+import math
 import pandas as pd
 import numpy as np
+import orjson
+import matplotlib
+matplotlib.use('Agg')  # Headless rendering straight to PNG
 import matplotlib.pyplot as plt
 from datetime import datetime
 
@@ -55,7 +59,7 @@ def run_qlearning_simulation():
     results.to_csv('outputs/session_results.csv', index=False)
     
     # Save model
-    scheduler.save_model('outputs/qlearning_model.json')
+    scheduler.save_model('outputs/qlearning_model.npz')
     
     print(f"✅ Q-Learning Simulation Complete!")
     print(f"   Sessions: {len(results)}")
@@ -65,15 +69,62 @@ def run_qlearning_simulation():
     
     return results
 
+LOAD_BANDS = ('low', 'moderate', 'high')
+
+def load_band_means(results_df):
+    """Mean accuracy and latency per load band, using one boolean mask per known band"""
+    bands = results_df['load_band'].to_numpy()
+    accuracy = results_df['accuracy'].to_numpy()
+    latency = results_df['avg_latency'].to_numpy()
+    
+    rows = []
+    for band in LOAD_BANDS:
+        mask = bands == band
+        if mask.any():
+            rows.append((band, accuracy[mask].mean(), latency[mask].mean()))
+    
+    return pd.DataFrame(rows, columns=['load_band', 'accuracy', 'avg_latency'])
+
+# Dashboard figure kept across generate_plots calls: (fig, axes, latency twin axis)
+_FIG_CACHE = {}
+
+def _dashboard_figure():
+    """Return the cached 2x2 dashboard figure, cleared for a new run"""
+    if 'dash' not in _FIG_CACHE:
+        fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+        _FIG_CACHE['dash'] = (fig, axes, axes[1, 1].twinx())
+    
+    fig, axes, twin = _FIG_CACHE['dash']
+    for ax in axes.flat:
+        ax.cla()
+    twin.cla()
+    # cla() resets the twin to a left-hand axis with an opaque background
+    twin.yaxis.tick_right()
+    twin.yaxis.set_label_position('right')
+    twin.patch.set_visible(False)
+    return fig, axes, twin
+
 def generate_plots(results_df):
     """Generate visualization plots"""
     print("\n📊 Generating Plots...")
     
     # Set up the plotting style
-    plt.style.use('default')
-    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    plt.style.use('fast')
+    fig, axes, ax3 = _dashboard_figure()
     fig.suptitle('Cognitive Assessment Analytics Dashboard', fontsize=16, fontweight='bold')
     
+    # Least-squares trend lines share the session axis: slope = cov(s, y) / var(s)
+    sessions = results_df['session'].to_numpy(dtype=np.float64)
+    s_mean = sessions.mean()
+    s_centered = sessions - s_mean
+    s_var = (s_centered * s_centered).sum()
+    
+    def linear_trend(y):
+        y = y.to_numpy(dtype=np.float64)
+        y_mean = y.mean()
+        slope = (s_centered * (y - y_mean)).sum() / s_var
+        return y_mean + slope * s_centered
+    
     # 1. Accuracy over time
     axes[0, 0].plot(results_df['session'], results_df['accuracy'], 'b-', linewidth=2, marker='o', markersize=4)
     axes[0, 0].set_title('Mean Recall Accuracy Per Session', fontweight='bold')
@@ -83,9 +134,7 @@ def generate_plots(results_df):
     axes[0, 0].set_ylim(0, 1)
     
     # Add trend line
-    z = np.polyfit(results_df['session'], results_df['accuracy'], 1)
-    p = np.poly1d(z)
-    axes[0, 0].plot(results_df['session'], p(results_df['session']), "r--", alpha=0.8, linewidth=2)
+    axes[0, 0].plot(sessions, linear_trend(results_df['accuracy']), "r--", alpha=0.8, linewidth=2)
     
     # 2. Response latency over time
     axes[0, 1].plot(results_df['session'], results_df['avg_latency'], 'g-', linewidth=2, marker='s', markersize=4)
@@ -95,9 +144,7 @@ def generate_plots(results_df):
     axes[0, 1].grid(True, alpha=0.3)
     
     # Add trend line
-    z = np.polyfit(results_df['session'], results_df['avg_latency'], 1)
-    p = np.poly1d(z)
-    axes[0, 1].plot(results_df['session'], p(results_df['session']), "r--", alpha=0.8, linewidth=2)
+    axes[0, 1].plot(sessions, linear_trend(results_df['avg_latency']), "r--", alpha=0.8, linewidth=2)
     
     # 3. Load band distribution
     load_counts = results_df['load_band'].value_counts()
@@ -107,10 +154,7 @@ def generate_plots(results_df):
     axes[1, 0].set_title('Cognitive Load Distribution', fontweight='bold')
     
     # 4. Performance by load band
-    load_performance = results_df.groupby('load_band').agg({
-        'accuracy': 'mean',
-        'avg_latency': 'mean'
-    }).reset_index()
+    load_performance = load_band_means(results_df)
     
     x = np.arange(len(load_performance))
     width = 0.35
@@ -127,15 +171,13 @@ def generate_plots(results_df):
     ax2.grid(True, alpha=0.3)
     
     # Add latency on secondary y-axis
-    ax3 = ax2.twinx()
     bars2 = ax3.bar(x + width/2, load_performance['avg_latency'], width,
                     label='Avg Latency (s)', color='lightcoral', alpha=0.8)
     ax3.set_ylabel('Latency (seconds)')
     ax3.legend(loc='upper right')
     
-    plt.tight_layout()
-    plt.savefig('outputs/cognitive_analytics_dashboard.png', dpi=300, bbox_inches='tight')
-    plt.close()
+    fig.tight_layout()
+    fig.savefig('outputs/cognitive_analytics_dashboard.png', dpi=150, bbox_inches='tight')
     
     print("✅ Plots generated: outputs/cognitive_analytics_dashboard.png")
 
@@ -143,6 +185,9 @@ def generate_clinician_report(results_df, speech_metrics):
     """Generate clinician-style report"""
     print("\n📋 Generating Clinician Report...")
     
+    # Report date, shared by the detailed rows and the summary
+    today = datetime.now().strftime('%Y-%m-%d')
+    
     # Calculate summary statistics
     total_sessions = len(results_df)
     avg_accuracy = results_df['accuracy'].mean()
@@ -153,41 +198,26 @@ def generate_clinician_report(results_df, speech_metrics):
     late_sessions = results_df['accuracy'].iloc[-10:].mean()
     improvement = late_sessions - early_sessions
     
-    # Load band analysis
-    load_analysis = results_df.groupby('load_band').agg({
-        'accuracy': ['mean', 'std'],
-        'avg_latency': ['mean', 'std'],
-        'session': 'count'
-    }).round(3)
-    
     # Create clinician report
-    report_data = []
-    
-    for _, row in results_df.iterrows():
-        # Calculate support needed score (simplified)
-        support_score = max(0, 1 - row['accuracy']) + (row['avg_latency'] / 10.0)
-        if row['load_band'] == 'high':
-            support_score += 0.2
-        elif row['load_band'] == 'moderate':
-            support_score += 0.1
-        
-        report_data.append({
-            'session': row['session'],
-            'date': datetime.now().strftime('%Y-%m-%d'),  # In practice, use actual dates
-            'accuracy': round(row['accuracy'], 3),
-            'avg_latency': round(row['avg_latency'], 2),
-            'load_band': row['load_band'],
-            'support_needed_score': round(support_score, 3),
-            'n_items': row['n_items']
-        })
+    # Support needed score (simplified): error rate + latency/10, plus a bump for moderate/high load
+    base_score = np.clip(1 - results_df['accuracy'].to_numpy(), 0, None) + results_df['avg_latency'].to_numpy() / 10.0
+    load_bump = results_df['load_band'].map({'high': 0.2, 'moderate': 0.1}).fillna(0.0).to_numpy()
     
     # Save detailed report
-    report_df = pd.DataFrame(report_data)
+    report_df = pd.DataFrame({
+        'session': results_df['session'],
+        'date': today,  # In practice, use actual dates
+        'accuracy': results_df['accuracy'].round(3),
+        'avg_latency': results_df['avg_latency'].round(2),
+        'load_band': results_df['load_band'],
+        'support_needed_score': np.round(base_score + load_bump, 3),
+        'n_items': results_df['n_items']
+    })
     report_df.to_csv('outputs/clinician_report_detailed.csv', index=False)
     
     # Create summary report
     summary_report = {
-        'assessment_date': datetime.now().strftime('%Y-%m-%d'),
+        'assessment_date': today,
         'total_sessions': total_sessions,
         'overall_accuracy': round(avg_accuracy, 3),
         'overall_latency': round(avg_latency, 2),
@@ -202,9 +232,8 @@ def generate_clinician_report(results_df, speech_metrics):
     }
     
     # Save summary report
-    with open('outputs/clinician_summary.json', 'w') as f:
-        import json
-        json.dump(summary_report, f, indent=2)
+    with open('outputs/clinician_summary.json', 'wb') as f:
+        f.write(orjson.dumps(summary_report, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
     
     print("✅ Clinician reports generated:")
     print("   - outputs/clinician_report_detailed.csv")
@@ -212,34 +241,44 @@ def generate_clinician_report(results_df, speech_metrics):
     
     return summary_report
 
+# Recommendation tiers: (exclusive upper bound, messages), checked in order.
+# nextafter keeps the original boundaries where the old code used '>' (latency 8.0, trend 0.1).
+ACCURACY_TIERS = [
+    (0.6, ["Consider memory training exercises and cognitive stimulation activities",
+           "Evaluate for potential cognitive decline and consider medical consultation"]),
+    (0.8, ["Continue with current memory exercises and consider increasing difficulty",
+           "Monitor progress closely and adjust intervention as needed"]),
+    (math.inf, ["Excellent memory performance - maintain current activities",
+                "Consider advanced cognitive challenges to maintain engagement"]),
+]
+LATENCY_TIERS = [
+    (3.0, ["Excellent processing speed - consider more complex memory tasks"]),
+    (math.nextafter(8.0, math.inf), []),
+    (math.inf, ["Processing speed may benefit from timed exercises and brain training",
+                "Consider activities that require quick decision-making"]),
+]
+TREND_TIERS = [
+    (-0.1, ["Declining performance - consider adjusting intervention approach",
+            "Monitor for signs of cognitive changes and consult healthcare provider"]),
+    (math.nextafter(0.1, math.inf), []),
+    (math.inf, ["Positive improvement trend - continue current intervention strategy"]),
+]
+
+def _tier_messages(tiers, value, nan_messages=()):
+    """Messages of the first tier whose upper bound is above value, or nan_messages for NaN"""
+    if math.isnan(value):
+        return nan_messages
+    return next(messages for bound, messages in tiers if value < bound)
+
 def generate_recommendations(accuracy, latency, improvement):
     """Generate clinical recommendations based on performance"""
     recommendations = []
     
-    # Accuracy-based recommendations
-    if accuracy < 0.6:
-        recommendations.append("Consider memory training exercises and cognitive stimulation activities")
-        recommendations.append("Evaluate for potential cognitive decline and consider medical consultation")
-    elif accuracy < 0.8:
-        recommendations.append("Continue with current memory exercises and consider increasing difficulty")
-        recommendations.append("Monitor progress closely and adjust intervention as needed")
-    else:
-        recommendations.append("Excellent memory performance - maintain current activities")
-        recommendations.append("Consider advanced cognitive challenges to maintain engagement")
-    
-    # Latency-based recommendations
-    if latency > 8.0:
-        recommendations.append("Processing speed may benefit from timed exercises and brain training")
-        recommendations.append("Consider activities that require quick decision-making")
-    elif latency < 3.0:
-        recommendations.append("Excellent processing speed - consider more complex memory tasks")
-    
-    # Trend-based recommendations
-    if improvement > 0.1:
-        recommendations.append("Positive improvement trend - continue current intervention strategy")
-    elif improvement < -0.1:
-        recommendations.append("Declining performance - consider adjusting intervention approach")
-        recommendations.append("Monitor for signs of cognitive changes and consult healthcare provider")
+    # Accuracy-based, latency-based, then trend-based recommendations
+    # NaN fails every comparison: accuracy lands in the top tier, latency and trend add nothing
+    recommendations.extend(_tier_messages(ACCURACY_TIERS, accuracy, nan_messages=ACCURACY_TIERS[-1][1]))
+    recommendations.extend(_tier_messages(LATENCY_TIERS, latency))
+    recommendations.extend(_tier_messages(TREND_TIERS, improvement))
     
     return recommendations
 
@@ -307,7 +346,7 @@ def main():
     print("📋 outputs/clinician_report_detailed.csv")
     print("📋 outputs/clinician_summary.json")
     print("🧠 outputs/speech_model.json")
-    print("🎯 outputs/qlearning_model.json")
+    print("🎯 outputs/qlearning_model.npz")
     print("📈 outputs/session_results.csv")
     print("\nTo start the API server:")
     print("   python src/api.py")
@@ -8,230 +8,299 @@ from flask_cors import CORS
 import cv2
 import numpy as np
 import base64
+import struct
 import json
+import orjson
 import uuid
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 import os
-from database import init_db, get_db, create_face, get_all_faces, get_face_by_id, delete_face
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import init_db, SessionLocal, create_face, get_all_faces, get_all_faces_metadata, get_face_ids, delete_face as db_delete_face
 from sqlalchemy.orm import Session
+from storage import create_image_storage
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_GRAY
+except ImportError:
+    TurboJPEG = None
 
 app = Flask(__name__)
 CORS(app)
 
+SFACE_MIN_SIMILARITY = (0.363 + 1) / 2
+TEMPLATE_SIZE = (64, 64)
+MAX_DETECTION_SIZE = 640  # Longest side used for detection; embeddings use full resolution
+FACE_VECTOR_SIZE = (100, 100)
+GALLERY_PATH = os.environ.get('FACE_GALLERY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gallery.bin'))
+# One record per gallery vector: face UUID string and its float32 unit vector
+GALLERY_RECORD = np.dtype([('id', 'S36'), ('vec', np.float32, (128,))])
+# Row order of the packed (5, 2) landmark arrays
+LANDMARK_KEYS = ("left_eye", "right_eye", "nose", "mouth_left", "mouth_right")
+# Weights for the eye-eye, nose-eye and mouth-nose distance ratios in feature-based matching
+FEATURE_WEIGHTS = np.array([0.4, 0.3, 0.3])
+
 class FaceRecognitionService:
     def __init__(self):
         """Initialize the face recognition service"""
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        # Route full-frame detection through OpenCL (T-API) when a device is present
+        self._use_umat = cv2.ocl.haveOpenCL()
+        cv2.ocl.setUseOpenCL(self._use_umat)
+        self.detector = self._load_yunet_detector()
+        # Haar cascades are only needed when YuNet (which also returns landmarks) is unavailable
+        self.face_cascade = None
+        self.eye_cascade = None
+        if self.detector is None:
+            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+        self.recognizer = self._load_sface_recognizer()
         # Database will be used instead of in-memory storage
         
         # Face recognition parameters
         self.face_encoding_size = 128  # Standard face encoding size
+        # SFace needs YuNet landmarks for alignment; otherwise fall back to the histogram encoding
+        self.vector_model = "sface" if self.detector is not None and self.recognizer is not None else "histogram"
+        
+        # Decoded registered face vectors, rebuilt only when the registered set changes
+        self._gallery_lock = threading.Lock()
+        self._gallery_cache = {"version": None, "matrix": None, "ids": None, "faces": None, "templates": None, "template_faces": None, "landmarks": None, "landmark_faces": None}
+        
+        # Per-face recognition runs in parallel; OpenCV and NumPy kernels release the GIL
+        self._pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        # Decode + detection runs here while the request thread fetches the gallery from the DB
+        self._cv_pool = ThreadPoolExecutor(max_workers=4)
+        
+        # Per-thread resize destinations, reused across requests instead of reallocated
+        self._buffers = threading.local()
         
-    def base64_to_image(self, base64_string: str) -> np.ndarray:
+        # libjpeg-turbo SIMD decoder for JPEG payloads, cv2.imdecode otherwise
+        self._tj = None
+        if TurboJPEG is not None:
+            try:
+                self._tj = TurboJPEG()
+            except Exception as e:
+                print(f"⚠️ libturbojpeg not available, using cv2.imdecode: {str(e)}")
+        
+        # Registered face crops live in file/object storage; rows only keep the URL
+        self._storage = create_image_storage()
+        
+    @staticmethod
+    def _model_path(env_var: str, filename: str) -> str:
+        """Resolve an ONNX model path from the environment or the local models directory"""
+        return os.environ.get(env_var, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', filename))
+    
+    def _load_yunet_detector(self):
+        """Load the YuNet DNN face detector if its model file is available"""
+        model_path = self._model_path('FACE_DETECTOR_MODEL', 'face_detection_yunet_2023mar.onnx')
+        if not os.path.exists(model_path) or not hasattr(cv2, 'FaceDetectorYN'):
+            print(f"⚠️ YuNet model not found at {model_path}, using Haar cascade")
+            return None
+        try:
+            detector = cv2.FaceDetectorYN.create(
+                model_path, '', (320, 320),
+                score_threshold=0.6, nms_threshold=0.3, top_k=5000,
+                backend_id=cv2.dnn.DNN_BACKEND_OPENCV,
+                target_id=cv2.dnn.DNN_TARGET_OPENCL if self._use_umat else cv2.dnn.DNN_TARGET_CPU
+            )
+            print(f"✅ Loaded YuNet face detector from {model_path}")
+            return detector
+        except Exception as e:
+            print(f"⚠️ Could not load YuNet detector: {str(e)}")
+            return None
+    
+    def _load_sface_recognizer(self):
+        """Load the SFace DNN face recognizer if its model file is available"""
+        model_path = self._model_path('FACE_RECOGNIZER_MODEL', 'face_recognition_sface_2021dec.onnx')
+        if not os.path.exists(model_path) or not hasattr(cv2, 'FaceRecognizerSF'):
+            print(f"⚠️ SFace model not found at {model_path}, using histogram face vectors")
+            return None
+        try:
+            recognizer = cv2.FaceRecognizerSF.create(model_path, '')
+            print(f"✅ Loaded SFace face recognizer from {model_path}")
+            return recognizer
+        except Exception as e:
+            print(f"⚠️ Could not load SFace recognizer: {str(e)}")
+            return None
+        
+    def base64_to_image(self, base64_string: str, grayscale: bool = False) -> np.ndarray:
         """Convert base64 string to OpenCV image"""
         try:
             # Remove data URL prefix if present
             if ',' in base64_string:
-                base64_string = base64_string.split(',')[1]
+                base64_string = base64_string.split(',', 1)[1]
             
             # Decode base64
             image_data = base64.b64decode(base64_string)
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            return image
+            return self.bytes_to_image(image_data, grayscale)
         except Exception as e:
             raise ValueError(f"Invalid base64 image data: {str(e)}")
     
-    def detect_faces(self, image: np.ndarray) -> List[Dict]:
-        """Memory-optimized face detection with improved parameters"""
-        print(f"🔍 Starting face detection on image size: {image.shape}")
-        
-        # Resize image if too large to save memory, but keep it large enough for detection
-        max_size = 1200  # Increased from 1000
-        min_size = 300   # Minimum size for face detection
-        
-        if image.shape[0] > max_size or image.shape[1] > max_size:
-            scale = min(max_size / image.shape[0], max_size / image.shape[1])
-            new_width = int(image.shape[1] * scale)
-            new_height = int(image.shape[0] * scale)
-            image = cv2.resize(image, (new_width, new_height))
-            print(f"🔍 Resized image to: {image.shape}")
-        elif image.shape[0] < min_size or image.shape[1] < min_size:
-            scale = max(min_size / image.shape[0], min_size / image.shape[1])
-            new_width = int(image.shape[1] * scale)
-            new_height = int(image.shape[0] * scale)
-            image = cv2.resize(image, (new_width, new_height))
-            print(f"🔍 Upscaled image to: {image.shape}")
-        
-        # Use only the most efficient detection method
-        faces = self._detect_faces_haar_optimized(image)
-        print(f"🔍 Detected {len(faces)} faces")
-        
-        return faces
+    @staticmethod
+    def _jpeg_orientation(data: bytes) -> int:
+        """EXIF Orientation tag (1-8) of a JPEG, 1 when absent or unreadable"""
+        try:
+            pos = 2
+            while pos + 4 <= len(data) and data[pos] == 0xFF:
+                marker = data[pos + 1]
+                length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+                if marker == 0xDA:  # start of scan: no metadata after this
+                    break
+                if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+                    tiff = data[pos + 10:pos + 2 + length]
+                    endian = "<" if tiff[:2] == b"II" else ">"
+                    ifd = struct.unpack(endian + "I", tiff[4:8])[0]
+                    for i in range(struct.unpack(endian + "H", tiff[ifd:ifd + 2])[0]):
+                        entry = ifd + 2 + 12 * i
+                        if struct.unpack(endian + "H", tiff[entry:entry + 2])[0] == 0x0112:
+                            orientation = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+                            return orientation if 1 <= orientation <= 8 else 1
+                    return 1
+                pos += 2 + length
+        except (struct.error, IndexError):
+            pass
+        return 1
     
-    def _detect_faces_haar_optimized(self, image: np.ndarray) -> List[Dict]:
-        """Memory-optimized Haar Cascade face detection with improved parameters"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply only essential preprocessing
-        gray = cv2.equalizeHist(gray)
-        
-        # Try multiple detection parameter sets for better face detection
-        detection_params = [
-            {"scaleFactor": 1.05, "minNeighbors": 2, "minSize": (20, 20)},
-            {"scaleFactor": 1.1, "minNeighbors": 3, "minSize": (25, 25)},
-            {"scaleFactor": 1.2, "minNeighbors": 4, "minSize": (30, 30)},
-        ]
-        
-        all_faces = []
-        for params in detection_params:
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=params["scaleFactor"],
-                minNeighbors=params["minNeighbors"],
-                minSize=params["minSize"],
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
-            
-            for i, (x, y, w, h) in enumerate(faces):
-                face_info = self._create_face_info(image, x, y, w, h, f"haar_{i}")
-                if face_info:
-                    all_faces.append(face_info)
-        
-        # Remove duplicate faces using IoU
-        return self._deduplicate_faces(all_faces)
+    @staticmethod
+    def _apply_orientation(image: np.ndarray, orientation: int) -> np.ndarray:
+        """Rotate/flip a decoded image upright the way cv2.imdecode applies EXIF orientation"""
+        if orientation in (5, 6, 7, 8):
+            image = cv2.transpose(image)
+        flip = {2: 1, 3: -1, 4: 0, 6: 1, 7: -1, 8: 0}.get(orientation)
+        return image if flip is None else cv2.flip(image, flip)
     
-    def _detect_faces_haar(self, image: np.ndarray) -> List[Dict]:
-        """Detect faces using Haar Cascade with multiple parameter sets"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def bytes_to_image(self, image_data: bytes, grayscale: bool = False) -> np.ndarray:
+        """Decode encoded image bytes, using libjpeg-turbo for JPEG when available"""
+        if self._tj is not None and image_data[:2] == b'\xff\xd8':
+            image = self._tj.decode(image_data, pixel_format=TJPF_GRAY if grayscale else TJPF_BGR)
+            # Unlike cv2.imdecode, turbojpeg ignores EXIF orientation (portrait phone photos)
+            return self._apply_orientation(image, self._jpeg_orientation(image_data))
+        nparr = np.frombuffer(image_data, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR)
+    
+    def _resize_into(self, src: np.ndarray, size: Tuple[int, int], name: str, capacity: Tuple[int, int]) -> np.ndarray:
+        """Resize into a reusable per-thread buffer; the result is only valid until the next call"""
+        w, h = size
+        if h > capacity[0] or w > capacity[1]:
+            return cv2.resize(src, size)
+        
+        buffer = getattr(self._buffers, name, None)
+        if buffer is None:
+            buffer = np.empty(capacity + src.shape[2:], dtype=src.dtype)
+            setattr(self._buffers, name, buffer)
+        return cv2.resize(src, size, dst=buffer[:h, :w])
+    
+    def detect_faces(self, image: np.ndarray, gray: Optional[np.ndarray] = None) -> List[Dict]:
+        """Detect faces on a downscaled copy and return boxes/landmarks in full-resolution coordinates"""
+        print(f"🔍 Starting face detection on image size: {image.shape}")
         
-        # Apply multiple preprocessing techniques
-        enhanced_images = [
-            gray,  # Original
-            cv2.equalizeHist(gray),  # Histogram equalization
-            cv2.GaussianBlur(gray, (3, 3), 0),  # Gaussian blur
-            cv2.bilateralFilter(gray, 9, 75, 75),  # Bilateral filter
-        ]
+        # Detection cost scales with area, so detect at a fixed maximum side
+        h, w = image.shape[:2]
+        scale = min(1.0, MAX_DETECTION_SIZE / max(h, w))
+        new_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        capacity = (MAX_DETECTION_SIZE, MAX_DETECTION_SIZE)
         
-        all_faces = []
-        
-        for enhanced_gray in enhanced_images:
-            # Try multiple detection parameters
-            detection_params = [
-                {"scaleFactor": 1.05, "minNeighbors": 3, "minSize": (20, 20)},
-                {"scaleFactor": 1.1, "minNeighbors": 4, "minSize": (30, 30)},
-                {"scaleFactor": 1.2, "minNeighbors": 5, "minSize": (40, 40)},
-                {"scaleFactor": 1.3, "minNeighbors": 6, "minSize": (50, 50)},
-            ]
-            
-            for params in detection_params:
-                faces = self.face_cascade.detectMultiScale(
-                    enhanced_gray,
-                    scaleFactor=params["scaleFactor"],
-                    minNeighbors=params["minNeighbors"],
-                    minSize=params["minSize"],
-                    flags=cv2.CASCADE_SCALE_IMAGE
-                )
-                
-                for i, (x, y, w, h) in enumerate(faces):
-                    face_info = self._create_face_info(image, x, y, w, h, f"haar_{i}")
-                    all_faces.append(face_info)
+        # Single-pass DNN detection when the model is available, Haar otherwise
+        if self.detector is not None:
+            small = image if scale == 1.0 else self._resize_into(image, new_size, "detect_bgr", capacity)
+            faces = self._detect_faces_yunet(small, image, scale)
+        else:
+            # Haar only needs grayscale: convert once (or reuse the caller's) and resize that
+            if gray is None:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            small = gray if scale == 1.0 else self._resize_into(gray, new_size, "detect_gray", capacity)
+            faces = self._detect_faces_haar_optimized(small, gray, scale)
+        if scale != 1.0:
+            print(f"🔍 Detected on resized image: {small.shape}")
+        print(f"🔍 Detected {len(faces)} faces")
         
-        return all_faces
+        return faces
     
-    def _detect_faces_template(self, image: np.ndarray) -> List[Dict]:
-        """Detect faces using template matching approach"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Create face templates at different scales
-        face_templates = self._create_face_templates()
+    def _detect_faces_yunet(self, small: np.ndarray, image: np.ndarray, scale: float) -> List[Dict]:
+        """Single-pass YuNet face detection with built-in landmarks and NMS"""
+        h, w = small.shape[:2]
+        self.detector.setInputSize((w, h))
+        _, detections = self.detector.detect(small)
+        if detections is None:
+            return []
         
         faces = []
-        for scale in [0.5, 0.75, 1.0, 1.25, 1.5]:
-            scaled_gray = cv2.resize(gray, None, fx=scale, fy=scale)
-            
-            for template in face_templates:
-                # Resize template to match scale
-                template_scaled = cv2.resize(template, None, fx=scale, fy=scale)
-                
-                # Template matching
-                result = cv2.matchTemplate(scaled_gray, template_scaled, cv2.TM_CCOEFF_NORMED)
-                locations = np.where(result >= 0.6)  # Threshold for face detection
-                
-                for pt in zip(*locations[::-1]):
-                    x, y = int(pt[0] / scale), int(pt[1] / scale)
-                    w, h = int(template.shape[1] / scale), int(template.shape[0] / scale)
-                    
-                    face_info = self._create_face_info(image, x, y, w, h, f"template_{len(faces)}")
-                    faces.append(face_info)
-        
+        for i, row in enumerate(detections):
+            # Map box and landmarks back to the full-resolution image
+            row = row.copy()
+            row[:14] /= scale
+            face_info = self._create_face_info_from_landmarks(image, row, f"yunet_{i}")
+            if face_info:
+                faces.append(face_info)
         return faces
     
-    def _detect_faces_edge(self, image: np.ndarray) -> List[Dict]:
-        """Detect faces using edge detection and contour analysis"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def _create_face_info_from_landmarks(self, image: np.ndarray, row: np.ndarray, face_id_prefix: str) -> Optional[Dict]:
+        """Create face information dictionary from a YuNet detection row"""
+        x, y, w, h = (int(round(v)) for v in row[:4])
+        x = max(0, min(x, image.shape[1] - 1))
+        y = max(0, min(y, image.shape[0] - 1))
+        w = min(w, image.shape[1] - x)
+        h = min(h, image.shape[0] - y)
         
-        # Edge detection
-        edges = cv2.Canny(gray, 50, 150)
+        if w <= 0 or h <= 0:
+            return None
         
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # YuNet landmarks are subject-relative: the subject's right eye/mouth corner is on the image left
+        points = [[int(round(row[j])), int(round(row[j + 1]))] for j in range(4, 14, 2)]
+        return {
+            "face_id": f"{face_id_prefix}_{uuid.uuid4().hex[:8]}",
+            "bounding_box": [x, y, w, h],
+            "confidence": float(row[14]),
+            "landmarks": {
+                "left_eye": points[0],
+                "right_eye": points[1],
+                "nose": points[2],
+                "mouth_left": points[3],
+                "mouth_right": points[4]
+            },
+            "_detection": row,  # Raw detection row, used for SFace alignment
+            "_landmarks_array": np.array(points, dtype=np.float32)
+        }
+    
+    def _detect_faces_haar_optimized(self, small: np.ndarray, gray: np.ndarray, scale: float) -> List[Dict]:
+        """Single-pass Haar Cascade fallback when the DNN detector is unavailable"""
+        # Apply only essential preprocessing; on a UMat both kernels stay on the OpenCL device
+        equalized = cv2.equalizeHist(cv2.UMat(small) if self._use_umat else small)
         
-        faces = []
-        for contour in contours:
-            # Filter contours by area and aspect ratio
-            area = cv2.contourArea(contour)
-            if area < 1000:  # Minimum face area
-                continue
-            
-            x, y, w, h = cv2.boundingRect(contour)
-            aspect_ratio = w / h
-            
-            # Face-like aspect ratio (roughly 0.7 to 1.3)
-            if 0.6 <= aspect_ratio <= 1.4:
-                face_info = self._create_face_info(image, x, y, w, h, f"edge_{len(faces)}")
-                faces.append(face_info)
+        # Skip the small pyramid levels where faces are implausible for this resolution
+        min_face = max(20, min(small.shape[:2]) // 20)
         
-        return faces
+        faces = self.face_cascade.detectMultiScale(
+            equalized,
+            scaleFactor=1.1,
+            minNeighbors=3,
+            minSize=(min_face, min_face),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        
+        # A single pass is already grouped by minNeighbors, so no IoU dedupe is needed
+        all_faces = []
+        for i, box in enumerate(faces):
+            # Eye landmarks are found on the full-resolution grayscale image
+            x, y, w, h = (int(round(v / scale)) for v in box)
+            face_info = self._create_face_info(gray, x, y, w, h, f"haar_{i}")
+            if face_info:
+                all_faces.append(face_info)
+        return all_faces
     
-    def _create_face_templates(self) -> List[np.ndarray]:
-        """Create face templates for template matching"""
-        # Create simple face templates (oval shapes)
-        templates = []
-        sizes = [(50, 50), (75, 75), (100, 100)]
-        
-        for w, h in sizes:
-            template = np.zeros((h, w), dtype=np.uint8)
-            # Create oval face shape
-            cv2.ellipse(template, (w//2, h//2), (w//2-5, h//2-5), 0, 0, 360, 255, -1)
-            # Add eyes
-            cv2.circle(template, (w//3, h//3), 3, 0, -1)
-            cv2.circle(template, (2*w//3, h//3), 3, 0, -1)
-            # Add nose
-            cv2.circle(template, (w//2, h//2), 2, 0, -1)
-            # Add mouth
-            cv2.ellipse(template, (w//2, 2*h//3), (w//6, h//12), 0, 0, 180, 0, 2)
-            
-            templates.append(template)
-        
-        return templates
-    
-    def _create_face_info(self, image: np.ndarray, x: int, y: int, w: int, h: int, face_id_prefix: str) -> Dict:
-        """Create face information dictionary with landmarks"""
+    def _create_face_info(self, gray: np.ndarray, x: int, y: int, w: int, h: int, face_id_prefix: str) -> Dict:
+        """Create face information dictionary with landmarks from a grayscale image"""
         # Ensure coordinates are within image bounds
-        x = max(0, min(x, image.shape[1] - w))
-        y = max(0, min(y, image.shape[0] - h))
-        w = min(w, image.shape[1] - x)
-        h = min(h, image.shape[0] - y)
+        x = max(0, min(x, gray.shape[1] - w))
+        y = max(0, min(y, gray.shape[0] - h))
+        w = min(w, gray.shape[1] - x)
+        h = min(h, gray.shape[0] - y)
         
         if w <= 0 or h <= 0:
             return None
         
         # Extract face region for landmark detection
-        face_roi = image[y:y+h, x:x+w]
-        gray_roi = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
+        gray_roi = gray[y:y+h, x:x+w]
         
         # Detect eyes within the face
         eyes = self.eye_cascade.detectMultiScale(
@@ -255,80 +324,46 @@ class FaceRecognitionService:
         mouth_y = int(y + h * 0.7)
         
         # Calculate confidence based on face size and eye detection
-        confidence = min(0.9, 0.5 + (w * h) / (image.shape[0] * image.shape[1]) * 2)
+        confidence = min(0.9, 0.5 + (w * h) / (gray.shape[0] * gray.shape[1]) * 2)
         if len(eye_landmarks) >= 2:
             confidence += 0.2
         
+        landmarks = {
+            "left_eye": [int(eye_landmarks[0][0]), int(eye_landmarks[0][1])] if len(eye_landmarks) > 0 else [int(nose_x - 20), int(nose_y - 10)],
+            "right_eye": [int(eye_landmarks[1][0]), int(eye_landmarks[1][1])] if len(eye_landmarks) > 1 else [int(nose_x + 20), int(nose_y - 10)],
+            "nose": [int(nose_x), int(nose_y)],
+            "mouth_left": [int(mouth_x - 15), int(mouth_y)],
+            "mouth_right": [int(mouth_x + 15), int(mouth_y)]
+        }
         return {
             "face_id": f"{face_id_prefix}_{uuid.uuid4().hex[:8]}",
             "bounding_box": [int(x), int(y), int(w), int(h)],
             "confidence": min(0.95, confidence),
-            "landmarks": {
-                "left_eye": [int(eye_landmarks[0][0]), int(eye_landmarks[0][1])] if len(eye_landmarks) > 0 else [int(nose_x - 20), int(nose_y - 10)],
-                "right_eye": [int(eye_landmarks[1][0]), int(eye_landmarks[1][1])] if len(eye_landmarks) > 1 else [int(nose_x + 20), int(nose_y - 10)],
-                "nose": [int(nose_x), int(nose_y)],
-                "mouth_left": [int(mouth_x - 15), int(mouth_y)],
-                "mouth_right": [int(mouth_x + 15), int(mouth_y)]
-            }
+            "landmarks": landmarks,
+            "_landmarks_array": np.array([landmarks[key] for key in LANDMARK_KEYS], dtype=np.float32)
         }
     
-    def _deduplicate_faces(self, faces: List[Dict]) -> List[Dict]:
-        """Remove duplicate face detections using IoU (Intersection over Union)"""
-        if not faces:
-            return []
-        
-        # Filter out None faces
-        valid_faces = [f for f in faces if f is not None]
-        if not valid_faces:
-            return []
-        
-        # Sort by confidence
-        valid_faces.sort(key=lambda x: x["confidence"], reverse=True)
-        
-        unique_faces = []
-        for face in valid_faces:
-            is_duplicate = False
-            for unique_face in unique_faces:
-                if self._calculate_iou(face["bounding_box"], unique_face["bounding_box"]) > 0.3:
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_faces.append(face)
-        
-        return unique_faces
-    
-    def _calculate_iou(self, box1: List[int], box2: List[int]) -> float:
-        """Calculate Intersection over Union between two bounding boxes"""
-        x1, y1, w1, h1 = box1
-        x2, y2, w2, h2 = box2
-        
-        # Calculate intersection
-        x_left = max(x1, x2)
-        y_top = max(y1, y2)
-        x_right = min(x1 + w1, x2 + w2)
-        y_bottom = min(y1 + h1, y2 + h2)
-        
-        if x_right < x_left or y_bottom < y_top:
-            return 0.0
-        
-        intersection = (x_right - x_left) * (y_bottom - y_top)
-        union = w1 * h1 + w2 * h2 - intersection
-        
-        return intersection / union if union > 0 else 0.0
-    
-    def extract_face_vector(self, image: np.ndarray, face_box: List[int]) -> np.ndarray:
+    def extract_face_vector(self, image: np.ndarray, face_box: List[int], detection: Optional[np.ndarray] = None,
+                            gray: Optional[np.ndarray] = None) -> np.ndarray:
         """Extract face encoding/vector from a detected face"""
         try:
+            if self.vector_model == "sface" and detection is not None:
+                # Align on the five YuNet landmarks and embed with SFace (128-D)
+                aligned = self.recognizer.alignCrop(image, detection)
+                face_vector = self.recognizer.feature(aligned).flatten().astype(np.float32)
+                print(f"🔍 Extracted SFace embedding of size: {len(face_vector)}")
+                return face_vector
+            
             x, y, w, h = face_box
-            face_roi = image[y:y+h, x:x+w]
             
-            # Convert to grayscale
-            gray_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
+            # Slice the request's grayscale image, converting only this ROI if none was given
+            if gray is not None:
+                gray_face = gray[y:y+h, x:x+w]
+            else:
+                gray_face = cv2.cvtColor(image[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
             
             # Resize to standard size for consistent encoding
-            standard_size = (100, 100)
-            resized_face = cv2.resize(gray_face, standard_size)
+            resized_face = self._resize_into(gray_face, FACE_VECTOR_SIZE, "face", FACE_VECTOR_SIZE[::-1])
             
             # Apply histogram equalization for better contrast
             equalized_face = cv2.equalizeHist(resized_face)
@@ -376,14 +411,158 @@ class FaceRecognitionService:
             print(f"❌ Error comparing face vectors: {str(e)}")
             return 0.0
     
+    @staticmethod
+    def _unit_vector(face_vector: np.ndarray) -> np.ndarray:
+        """L2-normalize a face vector as float32"""
+        vector = np.asarray(face_vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    @classmethod
+    def _quantize_face_vector(cls, face_vector: np.ndarray) -> bytes:
+        """L2-normalize a face vector and quantize it to int8, prefixed by its float32 scale"""
+        vector = cls._unit_vector(face_vector)
+        # Per-vector scale uses the full int8 range; a unit vector's largest component is well below 1
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.float32(scale).tobytes() + np.round(vector / scale).astype(np.int8).tobytes()
+    
+    def _dequantize_face_vector(self, data: bytes) -> np.ndarray:
+        """Inverse of _quantize_face_vector, also reading older unprefixed rows (fixed scale 1/127)"""
+        if len(data) == self.face_encoding_size + 4:
+            scale = np.frombuffer(data[:4], dtype=np.float32)[0]
+            return np.frombuffer(data[4:], dtype=np.int8) * scale
+        return np.frombuffer(data, dtype=np.int8) / np.float32(127)
+    
+    @staticmethod
+    def _normalize_template(gray: np.ndarray) -> np.ndarray:
+        """Resize a grayscale face to the template size and flatten it to a zero-mean unit vector"""
+        vector = cv2.resize(gray, TEMPLATE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+        vector -= vector.mean()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def _map_gallery_file(self, ids: List[str], matrix: np.ndarray) -> np.ndarray:
+        """Share the gallery matrix pages across worker processes through a memory-mapped file"""
+        try:
+            mapped = None
+            if os.path.exists(GALLERY_PATH) and os.path.getsize(GALLERY_PATH) > 0:
+                mapped = np.memmap(GALLERY_PATH, dtype=GALLERY_RECORD, mode='r')
+            # Reuse another worker's file when it holds exactly these vectors, otherwise rewrite it
+            if mapped is None or mapped['id'].tolist() != [face_id.encode() for face_id in ids]:
+                records = np.empty(len(ids), dtype=GALLERY_RECORD)
+                records['id'] = ids
+                records['vec'] = matrix
+                tmp_path = f"{GALLERY_PATH}.{os.getpid()}.tmp"
+                records.tofile(tmp_path)
+                os.replace(tmp_path, GALLERY_PATH)
+                mapped = np.memmap(GALLERY_PATH, dtype=GALLERY_RECORD, mode='r') if len(ids) else records
+            return mapped['vec']
+        except Exception as e:
+            print(f"⚠️ Could not share gallery file {GALLERY_PATH}: {str(e)}")
+            return matrix
+    
+    def _get_gallery(self, db: Session, force: bool = False) -> Dict:
+        """Return L2-normalized float32 registered face vectors, loading rows only when the gallery changed"""
+        # Readers work on one snapshot; the cache dict is never mutated after it is published
+        cache = self._gallery_cache
+        # The database is the source of truth: other workers, hosts and migrations change it
+        # without touching this host's gallery file, so the id set is checked on every call
+        face_ids = frozenset(get_face_ids(db))
+        if not force and cache["version"] == face_ids:
+            return cache
+        
+        # Only writers serialize, so concurrent misses rebuild once
+        with self._gallery_lock:
+            if not force and self._gallery_cache["version"] == face_ids:
+                return self._gallery_cache
+            return self._rebuild_gallery(db)
+    
+    def _rebuild_gallery(self, db: Session) -> Dict:
+        """Load every registered face and publish a new gallery snapshot"""
+        # Stored images only feed template matching, which the SFace pipeline never runs
+        use_templates = self.vector_model == "histogram"
+        registered_faces = get_all_faces(db, include_image=use_templates)
+        version = frozenset(face.id for face in registered_faces)
+        vectors, ids, faces, templates, landmarks = [], [], [], [], []
+        for registered_face in registered_faces:
+            face_meta = {
+                "face_id": str(registered_face.id),
+                "person_name": registered_face.person_name,
+                "relationship": registered_face.relationship or "Unknown",
+                "additional_info": registered_face.additional_info
+            }
+            
+            # Reduce stored landmarks to squared feature distances once per gallery version
+            if registered_face.landmarks:
+                try:
+                    landmarks.append((face_meta, self._landmark_sq_distances(json.loads(registered_face.landmarks))))
+                except Exception as e:
+                    print(f"Error decoding landmarks for {registered_face.id}: {e}")
+            
+            # Decode stored face images once per gallery version for template matching
+            if use_templates and (registered_face.image_url or registered_face.image_data):
+                try:
+                    if registered_face.image_url:
+                        registered_gray = self.bytes_to_image(self._storage.load(registered_face.image_url), grayscale=True)
+                    else:
+                        # Rows not yet offloaded by update_database.py still carry base64 data
+                        registered_gray = self.base64_to_image(registered_face.image_data, grayscale=True)
+                    if registered_gray is not None:
+                        templates.append((face_meta, self._normalize_template(registered_gray)))
+                except Exception as e:
+                    print(f"Error decoding face image for {registered_face.id}: {e}")
+            
+            # Embeddings from different extractors are not comparable
+            if (registered_face.face_vector_model or "histogram") != self.vector_model:
+                continue
+            try:
+                if registered_face.face_vector_blob:
+                    vectors.append(np.frombuffer(registered_face.face_vector_blob, dtype=np.float32))
+                elif registered_face.face_vector_i8:
+                    vectors.append(self._dequantize_face_vector(registered_face.face_vector_i8))
+                elif registered_face.face_vector:
+                    # Faces registered before binary storage only have the JSON column
+                    vectors.append(np.asarray(json.loads(registered_face.face_vector), dtype=np.float32))
+                else:
+                    continue
+            except Exception as e:
+                print(f"Error decoding face vector for {registered_face.id}: {e}")
+                continue
+            ids.append(face_meta["face_id"])
+            faces.append(face_meta)
+        
+        # One contiguous row-normalized matrix so recognition is a single SGEMV
+        # (new blobs are stored unit-length; legacy and int8 rows still need the division)
+        matrix = (np.vstack(vectors) if vectors
+                  else np.zeros((0, self.face_encoding_size), dtype=np.float32))
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        matrix = self._map_gallery_file(ids, matrix)
+        template_matrix = (np.stack([template for _, template in templates]) if templates
+                           else np.zeros((0, TEMPLATE_SIZE[0] * TEMPLATE_SIZE[1]), dtype=np.float32))
+        self._gallery_cache = {
+            "version": version,
+            "matrix": matrix,
+            "ids": ids,
+            "faces": faces,
+            "templates": template_matrix,
+            "template_faces": [face_meta for face_meta, _ in templates],
+            "landmarks": np.array([dists for _, dists in landmarks]).reshape(-1, 3),
+            "landmark_faces": [face_meta for face_meta, _ in landmarks],
+        }
+        print(f"🔍 Rebuilt face gallery cache with {len(ids)} vectors")
+        return self._gallery_cache
+    
     def register_face(self, image: np.ndarray, person_name: str, relationship: str = "Unknown", additional_info: str = "") -> Dict:
         """Register a new face for recognition"""
         try:
             print(f"🔍 Registering face for: {person_name} ({relationship})")
             print(f"🔍 Image shape: {image.shape}")
             
+            # Convert to grayscale once and share it between detection and encoding
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            
             # Detect faces in the image
-            faces = self.detect_faces(image)
+            faces = self.detect_faces(image, gray)
             
             if not faces:
                 print(f"❌ No faces detected for {person_name}")
@@ -399,23 +578,49 @@ class FaceRecognitionService:
             
             # Extract face vector for recognition
             print(f"🔍 Extracting face vector for {person_name}...")
-            face_vector = self.extract_face_vector(image, face_info["bounding_box"])
+            face_vector = self.extract_face_vector(image, face_info["bounding_box"], face_info.get("_detection"), gray)
             print(f"✅ Face vector extracted: {len(face_vector)} dimensions")
             
-            # Store face data in database
-            db = next(get_db())
+            # Keep the face crop out of the database; the row only stores where it went.
+            # Without durable storage the crop is not kept at all rather than written to a disk that may vanish.
+            image_url = None
             try:
+                if not self._storage.durable:
+                    raise RuntimeError("no durable image storage configured")
+                x, y, w, h = face_info["bounding_box"]
+                ok, encoded = cv2.imencode('.jpg', image[y:y+h, x:x+w])
+                if ok:
+                    image_url = self._storage.save(f"{uuid.uuid4().hex}.jpg", encoded.tobytes())
+            except Exception as e:
+                print(f"⚠️ Could not store face image for {person_name}: {str(e)}")
+            
+            # Store face data in database
+            with SessionLocal() as db:
                 print(f"💾 Saving face data to database for {person_name}")
-                db_face = create_face(
-                    db=db,
-                    person_name=person_name,
-                    relationship=relationship,
-                    additional_info=additional_info,
-                    bounding_box=json.dumps(face_info["bounding_box"]),
-                    landmarks=json.dumps(face_info["landmarks"]),
-                    face_vector=json.dumps(face_vector.tolist())
-                )
+                try:
+                    db_face = create_face(
+                        db=db,
+                        person_name=person_name,
+                        relationship=relationship,
+                        additional_info=additional_info,
+                        bounding_box=json.dumps(face_info["bounding_box"]),
+                        landmarks=json.dumps(face_info["landmarks"]),
+                        face_vector_blob=self._unit_vector(face_vector).tobytes(),
+                        face_vector_i8=self._quantize_face_vector(face_vector),
+                        face_vector_model=self.vector_model,
+                        image_url=image_url
+                    )
+                except Exception:
+                    # No row points at the stored crop, so do not leave it behind
+                    if image_url:
+                        try:
+                            self._storage.delete(image_url)
+                        except Exception as e:
+                            print(f"⚠️ Could not delete face image {image_url}: {str(e)}")
+                    raise
                 
+                # Rebuild now so the next recognition does not pay for it
+                self._get_gallery(db, force=True)
                 print(f"✅ Face registered successfully for {person_name} with ID: {db_face.id}")
                 return {
                     "success": True,
@@ -424,8 +629,6 @@ class FaceRecognitionService:
                     "relationship": relationship,
                     "message": f"Face registered successfully for {person_name}"
                 }
-            finally:
-                db.close()
             
         except Exception as e:
             return {
@@ -433,13 +636,41 @@ class FaceRecognitionService:
                 "error": f"Error registering face: {str(e)}"
             }
     
-    def recognize_faces(self, image: np.ndarray, tolerance: float = 0.6) -> List[Dict]:
+    def _decode_and_detect(self, payload) -> Tuple[np.ndarray, np.ndarray, List[Dict]]:
+        """Decode a base64 string or raw bytes, convert to grayscale once and detect faces"""
+        image = self.base64_to_image(payload) if isinstance(payload, str) else self.bytes_to_image(payload)
+        if image is None:
+            raise ValueError("Could not decode image data")
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image, gray, self.detect_faces(image, gray)
+    
+    def recognize_encoded(self, payload, tolerance: float = 0.6) -> Dict:
+        """Recognize faces in an encoded image, overlapping decode/detection with the gallery fetch"""
+        future = self._cv_pool.submit(self._decode_and_detect, payload)
+        
+        # Get all registered faces from database while the CV work runs
+        with SessionLocal() as db:
+            gallery = self._get_gallery(db)
+        
+        image, gray, faces = future.result()
+        return self.recognize_faces(image, tolerance, gray=gray, faces=faces, gallery=gallery)
+    
+    def recognize_faces(self, image: np.ndarray, tolerance: float = 0.6, gray: Optional[np.ndarray] = None,
+                        faces: Optional[List[Dict]] = None, gallery: Optional[Dict] = None) -> List[Dict]:
         """Enhanced face recognition with multiple ML algorithms and better matching"""
         try:
+            if self.vector_model == "sface":
+                # OpenCV's recommended SFace cosine threshold (0.363) on the 0-1 similarity scale
+                tolerance = max(tolerance, SFACE_MIN_SIMILARITY)
             print(f"🔍 Starting enhanced face recognition with tolerance: {tolerance}")
             
+            # Convert to grayscale once and share it across detection and all matchers
+            if gray is None:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            
             # Detect faces using enhanced detection
-            faces = self.detect_faces(image)
+            if faces is None:
+                faces = self.detect_faces(image, gray)
             print(f"🔍 Detected {len(faces)} faces for recognition")
             
             if not faces:
@@ -450,86 +681,40 @@ class FaceRecognitionService:
                 }
             
             # Get all registered faces from database
-            db = next(get_db())
-            try:
-                registered_faces = get_all_faces(db)
-                print(f"🔍 Found {len(registered_faces)} registered faces in database")
-                
-                recognized_faces = []
-                
-                for i, face_info in enumerate(faces):
-                    print(f"🔍 Processing face {i+1}/{len(faces)}: {face_info['face_id']}")
-                    
-                    # Extract face vector for this detected face
-                    face_vector = self.extract_face_vector(image, face_info["bounding_box"])
-                    
-                    if face_vector is None:
-                        print(f"❌ Failed to extract vector for face {i+1}")
-                        continue
-                    
-                    # Try multiple recognition methods
-                    recognition_results = []
-                    
-                    # Method 1: Direct vector similarity
-                    direct_match = self._recognize_direct_similarity(face_vector, registered_faces, tolerance)
-                    if direct_match:
-                        recognition_results.append(direct_match)
-                    
-                    # Method 2: Feature-based matching
-                    feature_match = self._recognize_feature_based(face_info, registered_faces, tolerance)
-                    if feature_match:
-                        recognition_results.append(feature_match)
-                    
-                    # Method 3: Template matching
-                    template_match = self._recognize_template_matching(image, face_info, registered_faces, tolerance)
-                    if template_match:
-                        recognition_results.append(template_match)
-                    
-                    # Choose the best match from all methods
-                    if recognition_results:
-                        # Sort by confidence and take the best
-                        recognition_results.sort(key=lambda x: x["confidence"], reverse=True)
-                        best_match = recognition_results[0]
-                        
-                        # Apply additional validation
-                        if self._validate_face_match(face_info, best_match):
-                            # Set the face location and landmarks
-                            best_match["face_location"] = face_info["bounding_box"]
-                            best_match["landmarks"] = face_info["landmarks"]
-                            recognized_faces.append(best_match)
-                            print(f"✅ Recognized face {i+1} as {best_match['person_name']} (confidence: {best_match['confidence']:.3f})")
-                        else:
-                            print(f"❌ Face {i+1} failed validation")
-                            # Add as unknown
-                            recognized_faces.append({
-                                "face_id": face_info["face_id"],
-                                "person_name": "Unknown",
-                                "relationship": "Unknown",
-                                "additional_info": None,
-                                "confidence": 0.0,
-                                "face_location": face_info["bounding_box"],
-                                "landmarks": face_info["landmarks"]
-                            })
-                    else:
-                        print(f"❌ No match found for face {i+1}")
-                        recognized_faces.append({
-                            "face_id": face_info["face_id"],
-                            "person_name": "Unknown",
-                            "relationship": "Unknown",
-                            "additional_info": None,
-                            "confidence": 0.0,
-                            "face_location": face_info["bounding_box"],
-                            "landmarks": face_info["landmarks"]
-                        })
-                
-                print(f"✅ Recognition complete: {len(recognized_faces)} faces processed")
+            if gallery is None:
+                with SessionLocal() as db:
+                    gallery = self._get_gallery(db)
+            print(f"🔍 Found {len(gallery['ids'])} registered face vectors in gallery")
+            
+            # Nothing any matcher could compare against: skip embedding extraction entirely
+            has_fallback_data = self.vector_model == "histogram" and (len(gallery["templates"]) or len(gallery["landmarks"]))
+            if not gallery["ids"] and not has_fallback_data:
+                print("🔍 Gallery is empty, returning all faces as Unknown")
                 return {
                     "success": True,
-                    "results": recognized_faces
+                    "results": [self._unknown_result(face_info) for face_info in faces]
                 }
-                
-            finally:
-                db.close()
+            
+            # Validate every face's landmarks in one vectorized pass
+            landmarks_ok = self._landmarks_valid(np.stack([face_info["_landmarks_array"] for face_info in faces]))
+            for face_info, ok in zip(faces, landmarks_ok):
+                face_info["_landmarks_valid"] = bool(ok)
+            
+            # Gallery is built above on this thread; workers only read cached arrays
+            if len(faces) > 1:
+                results = list(self._pool.map(
+                    lambda item: self._recognize_one(image, gray, item[0], item[1], len(faces), gallery, tolerance),
+                    enumerate(faces)
+                ))
+            else:
+                results = [self._recognize_one(image, gray, 0, faces[0], 1, gallery, tolerance)]
+            recognized_faces = [result for result in results if result is not None]
+            
+            print(f"✅ Recognition complete: {len(recognized_faces)} faces processed")
+            return {
+                "success": True,
+                "results": recognized_faces
+            }
             
         except Exception as e:
             print(f"❌ Error in face recognition: {str(e)}")
@@ -540,139 +725,169 @@ class FaceRecognitionService:
                 "error": f"Error recognizing faces: {str(e)}"
             }
     
-    def _recognize_direct_similarity(self, face_vector: np.ndarray, registered_faces: List, tolerance: float) -> Optional[Dict]:
+    def _recognize_one(self, image: np.ndarray, gray: np.ndarray, i: int, face_info: Dict, n_faces: int, gallery: Dict, tolerance: float) -> Optional[Dict]:
+        """Run the recognition methods for one detected face and return its result"""
+        print(f"🔍 Processing face {i+1}/{n_faces}: {face_info['face_id']}")
+        
+        # Extract face vector for this detected face
+        face_vector = self.extract_face_vector(image, face_info["bounding_box"], face_info.get("_detection"), gray)
+        
+        if face_vector is None:
+            print(f"❌ Failed to extract vector for face {i+1}")
+            return None
+        
+        # Try multiple recognition methods
+        recognition_results = []
+        
+        # Method 1: Direct vector similarity
+        direct_match = self._recognize_direct_similarity(face_vector, gallery, tolerance)
+        if direct_match:
+            recognition_results.append(direct_match)
+        
+        # SFace embeddings are discriminative on their own; the fallbacks only help histograms
+        if self.vector_model == "histogram":
+            # Method 2: Feature-based matching
+            feature_match = self._recognize_feature_based(face_info, gallery, tolerance)
+            if feature_match:
+                recognition_results.append(feature_match)
+            
+            # Method 3: Template matching
+            template_match = self._recognize_template_matching(gray, face_info, gallery, tolerance)
+            if template_match:
+                recognition_results.append(template_match)
+        
+        # Choose the best match from all methods
+        if recognition_results:
+            # Sort by confidence and take the best
+            recognition_results.sort(key=lambda x: x["confidence"], reverse=True)
+            best_match = recognition_results[0]
+            
+            # Apply additional validation
+            if self._validate_face_match(face_info, best_match):
+                # Set the face location and landmarks
+                best_match["face_location"] = face_info["bounding_box"]
+                best_match["landmarks"] = face_info["landmarks"]
+                print(f"✅ Recognized face {i+1} as {best_match['person_name']} (confidence: {best_match['confidence']:.3f})")
+                return best_match
+            print(f"❌ Face {i+1} failed validation")
+        else:
+            print(f"❌ No match found for face {i+1}")
+        
+        # Add as unknown
+        return self._unknown_result(face_info)
+    
+    @staticmethod
+    def _unknown_result(face_info: Dict) -> Dict:
+        """Recognition result for a detected face that matched nobody"""
+        return {
+            "face_id": face_info["face_id"],
+            "person_name": "Unknown",
+            "relationship": "Unknown",
+            "additional_info": None,
+            "confidence": 0.0,
+            "face_location": face_info["bounding_box"],
+            "landmarks": face_info["landmarks"]
+        }
+    
+    def _recognize_direct_similarity(self, face_vector: np.ndarray, gallery: Dict, tolerance: float) -> Optional[Dict]:
         """Direct vector similarity matching"""
-        best_match = None
-        best_similarity = 0.0
+        matrix = gallery["matrix"]
+        if len(matrix) == 0:
+            return None
         
-        for registered_face in registered_faces:
-            if registered_face.face_vector:
-                try:
-                    registered_vector = np.array(json.loads(registered_face.face_vector))
-                    similarity = self.compare_face_vectors(face_vector, registered_vector)
-                    
-                    if similarity > best_similarity and similarity > tolerance:
-                        best_similarity = similarity
-                        best_match = registered_face
-                except Exception as e:
-                    print(f"Error in direct similarity: {e}")
-                    continue
+        # Gallery rows are unit vectors, so one matrix-vector product gives every cosine similarity
+        query = np.asarray(face_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        scores = matrix @ (query / norm)
+        best_index = int(np.argmax(scores))
         
-        if best_match:
-            return {
-                "face_id": str(best_match.id),
-                "person_name": best_match.person_name,
-                "relationship": best_match.relationship or "Unknown",
-                "additional_info": best_match.additional_info,
-                "confidence": best_similarity,
-                "method": "direct_similarity"
-            }
-        return None
+        # tolerance is on the (cos + 1) / 2 scale, so compare the raw dot product against 2 * tolerance - 1
+        best_score = float(scores[best_index])
+        if best_score <= 2.0 * tolerance - 1.0:
+            return None
+        best_similarity = (min(best_score, 1.0) + 1) * 0.5
+        
+        return {
+            **gallery["faces"][best_index],
+            "confidence": best_similarity,
+            "method": "direct_similarity"
+        }
     
-    def _recognize_feature_based(self, face_info: Dict, registered_faces: List, tolerance: float) -> Optional[Dict]:
+    def _recognize_feature_based(self, face_info: Dict, gallery: Dict, tolerance: float) -> Optional[Dict]:
         """Feature-based matching using facial landmarks"""
-        landmarks = face_info["landmarks"]
+        stored = gallery["landmarks"]
+        if len(stored) == 0:
+            return None
         
-        best_match = None
-        best_score = 0.0
+        try:
+            # Compare facial feature ratios against every stored face at once
+            scores = self._feature_ratio_scores(self._landmark_sq_distances(face_info["landmarks"]), stored)
+        except Exception as e:
+            print(f"Error in feature-based matching: {e}")
+            return None
         
-        for registered_face in registered_faces:
-            if registered_face.landmarks:
-                try:
-                    # Compare facial feature ratios
-                    stored_landmarks = json.loads(registered_face.landmarks)
-                    score = self._compare_facial_features(landmarks, stored_landmarks)
-                    
-                    if score > best_score and score > tolerance:
-                        best_score = score
-                        best_match = registered_face
-                except Exception as e:
-                    print(f"Error in feature-based matching: {e}")
-                    continue
+        best_index = int(np.argmax(scores))
+        best_score = float(scores[best_index])
+        if best_score <= tolerance:
+            return None
         
-        if best_match:
-            return {
-                "face_id": str(best_match.id),
-                "person_name": best_match.person_name,
-                "relationship": best_match.relationship or "Unknown",
-                "additional_info": best_match.additional_info,
-                "confidence": best_score,
-                "method": "feature_based"
-            }
-        return None
+        return {
+            **gallery["landmark_faces"][best_index],
+            "confidence": best_score,
+            "method": "feature_based"
+        }
     
-    def _recognize_template_matching(self, image: np.ndarray, face_info: Dict, registered_faces: List, tolerance: float) -> Optional[Dict]:
+    def _recognize_template_matching(self, gray: np.ndarray, face_info: Dict, gallery: Dict, tolerance: float) -> Optional[Dict]:
         """Template matching recognition"""
+        templates = gallery["templates"]
+        if len(templates) == 0:
+            return None
+        
         face_box = face_info["bounding_box"]
         x, y, w, h = face_box
-        face_roi = image[y:y+h, x:x+w]
-        
-        best_match = None
-        best_score = 0.0
+        face_gray = gray[y:y+h, x:x+w]
         
-        for registered_face in registered_faces:
-            if registered_face.image_data:
-                try:
-                    # Convert registered face image
-                    registered_image = self.base64_to_image(registered_face.image_data)
-                    registered_gray = cv2.cvtColor(registered_image, cv2.COLOR_BGR2GRAY)
-                    
-                    # Resize to match
-                    face_gray = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-                    registered_resized = cv2.resize(registered_gray, (w, h))
-                    
-                    # Template matching
-                    result = cv2.matchTemplate(face_gray, registered_resized, cv2.TM_CCOEFF_NORMED)
-                    score = np.max(result)
-                    
-                    if score > best_score and score > tolerance:
-                        best_score = score
-                        best_match = registered_face
-                except Exception as e:
-                    print(f"Error in template matching: {e}")
-                    continue
+        # Same-size TM_CCOEFF_NORMED is the correlation of zero-mean unit vectors: one GEMV over the gallery
+        scores = templates @ self._normalize_template(face_gray)
+        best_index = int(np.argmax(scores))
+        best_score = float(scores[best_index])
+        if best_score <= tolerance:
+            return None
         
-        if best_match:
-            return {
-                "face_id": str(best_match.id),
-                "person_name": best_match.person_name,
-                "relationship": best_match.relationship or "Unknown",
-                "additional_info": best_match.additional_info,
-                "confidence": best_score,
-                "method": "template_matching"
-            }
-        return None
+        return {
+            **gallery["template_faces"][best_index],
+            "confidence": best_score,
+            "method": "template_matching"
+        }
+    
+    @staticmethod
+    def _landmark_sq_distances(landmarks: Dict) -> np.ndarray:
+        """Squared eye-eye, nose-eye and mouth-nose distances for a set of landmarks"""
+        start = np.array([landmarks["left_eye"], landmarks["nose"], landmarks["mouth_left"]], dtype=np.float64)
+        end = np.array([landmarks["right_eye"], landmarks["left_eye"], landmarks["nose"]], dtype=np.float64)
+        diff = start - end
+        return (diff * diff).sum(axis=-1)
+    
+    @staticmethod
+    def _feature_ratio_scores(query_sq: np.ndarray, stored_sq: np.ndarray) -> np.ndarray:
+        """Weighted min/max distance ratios; ratios of squares need a single sqrt"""
+        low = np.minimum(query_sq, stored_sq)
+        high = np.maximum(query_sq, stored_sq)
+        ratios = np.sqrt(np.divide(low, high, out=np.zeros(np.broadcast(low, high).shape), where=high > 0))
+        return ratios @ FEATURE_WEIGHTS
     
     def _compare_facial_features(self, landmarks1: Dict, landmarks2: Dict) -> float:
         """Compare facial features between two sets of landmarks"""
         try:
-            # Calculate eye distance ratio
-            eye_dist1 = self._calculate_distance(landmarks1["left_eye"], landmarks1["right_eye"])
-            eye_dist2 = self._calculate_distance(landmarks2["left_eye"], landmarks2["right_eye"])
-            eye_ratio = min(eye_dist1, eye_dist2) / max(eye_dist1, eye_dist2) if max(eye_dist1, eye_dist2) > 0 else 0
-            
-            # Calculate nose position ratio
-            nose_eye_dist1 = self._calculate_distance(landmarks1["nose"], landmarks1["left_eye"])
-            nose_eye_dist2 = self._calculate_distance(landmarks2["nose"], landmarks2["left_eye"])
-            nose_ratio = min(nose_eye_dist1, nose_eye_dist2) / max(nose_eye_dist1, nose_eye_dist2) if max(nose_eye_dist1, nose_eye_dist2) > 0 else 0
-            
-            # Calculate mouth position ratio
-            mouth_nose_dist1 = self._calculate_distance(landmarks1["mouth_left"], landmarks1["nose"])
-            mouth_nose_dist2 = self._calculate_distance(landmarks2["mouth_left"], landmarks2["nose"])
-            mouth_ratio = min(mouth_nose_dist1, mouth_nose_dist2) / max(mouth_nose_dist1, mouth_nose_dist2) if max(mouth_nose_dist1, mouth_nose_dist2) > 0 else 0
-            
-            # Combine ratios (weighted average)
-            overall_score = (eye_ratio * 0.4 + nose_ratio * 0.3 + mouth_ratio * 0.3)
-            return overall_score
-            
+            return float(self._feature_ratio_scores(
+                self._landmark_sq_distances(landmarks1), self._landmark_sq_distances(landmarks2)
+            ))
         except Exception as e:
             print(f"Error comparing facial features: {e}")
             return 0.0
     
-    def _calculate_distance(self, point1: List[int], point2: List[int]) -> float:
-        """Calculate Euclidean distance between two points"""
-        return np.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
-    
     def _validate_face_match(self, face_info: Dict, match: Dict) -> bool:
         """Validate if a face match is reliable"""
         try:
@@ -683,12 +898,14 @@ class FaceRecognitionService:
             # Check face size (should be reasonable)
             face_box = face_info["bounding_box"]
             w, h = face_box[2], face_box[3]
-            if w < 20 or h < 20 or w > 500 or h > 500:
+            if w < 20 or h < 20:
                 return False
             
             # Check if landmarks are reasonable
-            landmarks = face_info["landmarks"]
-            if not self._validate_landmarks(landmarks):
+            landmarks_ok = face_info.get("_landmarks_valid")
+            if landmarks_ok is None:
+                landmarks_ok = self._validate_landmarks(face_info["_landmarks_array"])
+            if not landmarks_ok:
                 return False
             
             return True
@@ -697,33 +914,17 @@ class FaceRecognitionService:
             print(f"Error validating face match: {e}")
             return False
     
-    def _validate_landmarks(self, landmarks: Dict) -> bool:
+    @staticmethod
+    def _landmarks_valid(points: np.ndarray) -> np.ndarray:
+        """Landmark sanity checks on packed (..., 5, 2) arrays, one result per face"""
+        left_eye, right_eye, nose = points[..., 0, :], points[..., 1, :], points[..., 2, :]
+        # Eyes roughly level, nose horizontally between them
+        return ((np.abs(left_eye[..., 1] - right_eye[..., 1]) <= 50)
+                & (left_eye[..., 0] < nose[..., 0]) & (nose[..., 0] < right_eye[..., 0]))
+    
+    def _validate_landmarks(self, points: np.ndarray) -> bool:
         """Validate if landmarks are reasonable"""
-        try:
-            # Check if all required landmarks exist
-            required_keys = ["left_eye", "right_eye", "nose", "mouth_left", "mouth_right"]
-            for key in required_keys:
-                if key not in landmarks or len(landmarks[key]) != 2:
-                    return False
-            
-            # Check if eyes are roughly at the same level
-            left_eye_y = landmarks["left_eye"][1]
-            right_eye_y = landmarks["right_eye"][1]
-            if abs(left_eye_y - right_eye_y) > 50:  # Eyes too far apart vertically
-                return False
-            
-            # Check if nose is between eyes
-            nose_x = landmarks["nose"][0]
-            left_eye_x = landmarks["left_eye"][0]
-            right_eye_x = landmarks["right_eye"][0]
-            if not (left_eye_x < nose_x < right_eye_x):
-                return False
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error validating landmarks: {e}")
-            return False
+        return bool(self._landmarks_valid(points))
     
     def get_face_landmarks(self, image: np.ndarray) -> List[Dict]:
         """Get face landmarks for visualization"""
@@ -750,23 +951,29 @@ class FaceRecognitionService:
                 "error": f"Error getting face landmarks: {str(e)}"
             }
     
+    def _stored_vector_size(self, face) -> int:
+        """Number of dimensions in a registered face's stored vector, from a metadata row"""
+        if face.vector_bytes:
+            return face.vector_bytes // np.dtype(np.float32).itemsize
+        # Legacy JSON vectors were always written by the 128-dimensional extractor
+        return self.face_encoding_size if face.has_json_vector else 0
+    
     def get_registered_faces(self) -> List[Dict]:
         """Get list of all registered faces"""
         try:
-            db = next(get_db())
-            try:
-                faces = get_all_faces(db)
+            with SessionLocal() as db:
+                faces = get_all_faces_metadata(db)
                 faces_list = []
                 for face in faces:
                     face_info = {
-                        "face_id": str(face.id),  # Changed from "id" to "face_id"
+                        "face_id": face.id,  # Changed from "id" to "face_id"
                         "person_name": face.person_name,
                         "relationship": face.relationship,
                         "additional_info": face.additional_info,
-                        "has_vector": bool(face.face_vector),  # Indicate if face vector exists
-                        "vector_size": len(json.loads(face.face_vector)) if face.face_vector else 0,
-                        "created_at": face.created_at.isoformat() if face.created_at else None,
-                        "registered_at": face.created_at.isoformat() if face.created_at else None  # Add registered_at for iOS compatibility
+                        "has_vector": bool(face.vector_bytes or face.has_json_vector),  # Indicate if face vector exists
+                        "vector_size": self._stored_vector_size(face),
+                        "created_at": face.created_at,  # orjson writes UUIDs and datetimes directly
+                        "registered_at": face.created_at  # Add registered_at for iOS compatibility
                     }
                     faces_list.append(face_info)
                 
@@ -774,8 +981,6 @@ class FaceRecognitionService:
                     "success": True,
                     "faces": faces_list
                 }
-            finally:
-                db.close()
         except Exception as e:
             return {
                 "success": False,
@@ -785,10 +990,15 @@ class FaceRecognitionService:
     def delete_face(self, face_id: str) -> Dict:
         """Delete a registered face"""
         try:
-            db = next(get_db())
-            try:
-                success = delete_face(db, face_id)
-                if success:
+            with SessionLocal() as db:
+                deleted = db_delete_face(db, face_id)
+                if deleted:
+                    if deleted.image_url:
+                        try:
+                            self._storage.delete(deleted.image_url)
+                        except Exception as e:
+                            print(f"⚠️ Could not delete face image {deleted.image_url}: {str(e)}")
+                    self._get_gallery(db, force=True)
                     return {
                         "success": True,
                         "message": f"Face {face_id} deleted successfully"
@@ -798,8 +1008,6 @@ class FaceRecognitionService:
                         "success": False,
                         "error": f"Face {face_id} not found"
                     }
-            finally:
-                db.close()
                 
         except Exception as e:
             return {
@@ -810,6 +1018,10 @@ class FaceRecognitionService:
 # Global instance
 face_service = FaceRecognitionService()
 
+def ojsonify(obj, status: int = 200):
+    """jsonify replacement serialized with orjson (handles UUID, datetime and numpy values natively)"""
+    return app.response_class(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY), status=status, mimetype='application/json')
+
 # Health check endpoint
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -839,7 +1051,7 @@ def init_database():
 # Face Recognition Endpoints
 @app.route('/face/register', methods=['POST'])
 def register_face():
-    """Register a new face for recognition"""
+    """Register a new face from a base64 JSON image (kept for compatibility; see /face/register_raw)"""
     try:
         data = request.get_json()
         print(f"📝 Face registration request received")
@@ -881,7 +1093,7 @@ def register_face():
 
 @app.route('/face/recognize', methods=['POST'])
 def recognize_face():
-    """Recognize faces in an image"""
+    """Recognize faces in a base64 JSON image (kept for compatibility; see /face/recognize_raw)"""
     try:
         data = request.get_json()
         if not data or 'imageData' not in data:
@@ -890,17 +1102,14 @@ def recognize_face():
                 "error": "imageData is required"
             }), 400
         
-        # Convert base64 to OpenCV image
-        image = face_service.base64_to_image(data['imageData'])
-        
-        # Recognize faces
+        # Decode and detect on the CV pool while the gallery is fetched
         tolerance = data.get('tolerance', 0.6)
-        result = face_service.recognize_faces(image, tolerance)
+        result = face_service.recognize_encoded(data['imageData'], tolerance)
         
         if result['success']:
-            return jsonify(result), 200
+            return ojsonify(result, 200)
         else:
-            return jsonify(result), 400
+            return ojsonify(result, 400)
         
     except Exception as e:
         print(f"❌ Error recognizing face: {str(e)}")
@@ -909,6 +1118,95 @@ def recognize_face():
             "error": f"Error recognizing face: {str(e)}"
         }), 500
 
+def read_raw_bytes() -> bytes:
+    """Read image bytes sent as a multipart 'image' file or as the raw request body"""
+    if 'image' in request.files:
+        raw = request.files['image'].stream.read()
+    else:
+        raw = request.get_data(cache=False)
+    if not raw:
+        raise ValueError("Image bytes are required")
+    return raw
+
+def read_raw_image() -> np.ndarray:
+    """Decode an image sent as a multipart 'image' file or as the raw request body"""
+    image = face_service.bytes_to_image(read_raw_bytes())
+    if image is None:
+        raise ValueError("Could not decode image bytes")
+    return image
+
+@app.route('/face/recognize_raw', methods=['POST'])
+def recognize_face_raw():
+    """Recognize faces in an image uploaded as raw bytes (preferred over base64 JSON)"""
+    try:
+        try:
+            raw = read_raw_bytes()
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        # Recognize faces; decoding runs on the CV pool alongside the gallery fetch
+        tolerance = float(request.values.get('tolerance', 0.6))
+        result = face_service.recognize_encoded(raw, tolerance)
+        
+        if result['success']:
+            return ojsonify(result, 200)
+        else:
+            return ojsonify(result, 400)
+        
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    except Exception as e:
+        print(f"❌ Error recognizing face: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": f"Error recognizing face: {str(e)}"
+        }), 500
+
+@app.route('/face/register_raw', methods=['POST'])
+def register_face_raw():
+    """Register a face from an image uploaded as raw bytes (preferred over base64 JSON)"""
+    try:
+        person_name = request.values.get('personName')
+        if not person_name:
+            return jsonify({
+                "success": False,
+                "error": "personName is required"
+            }), 400
+        
+        try:
+            image = read_raw_image()
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        # Register the face
+        result = face_service.register_face(
+            image=image,
+            person_name=person_name,
+            relationship=request.values.get('relationship', 'Unknown'),
+            additional_info=request.values.get('additionalInfo', '')
+        )
+        
+        if result['success']:
+            return jsonify(result), 201
+        else:
+            return jsonify(result), 400
+        
+    except Exception as e:
+        print(f"❌ Error registering face: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": f"Error registering face: {str(e)}"
+        }), 500
+
 @app.route('/face/landmarks', methods=['POST'])
 def get_face_landmarks():
     """Get face landmarks for visualization"""
@@ -945,7 +1243,7 @@ def get_registered_faces():
         print(f"📝 Getting registered faces...")
         result = face_service.get_registered_faces()
         print(f"📝 Found {len(result.get('faces', []))} registered faces")
-        return jsonify(result), 200
+        return ojsonify(result, 200)
         
     except Exception as e:
         print(f"❌ Error getting registered faces: {str(e)}")
@@ -997,7 +1295,7 @@ def verify_face_vector():
         
         # Extract face vector for the first detected face
         face_info = faces[0]
-        face_vector = face_service.extract_face_vector(image, face_info["bounding_box"])
+        face_vector = face_service.extract_face_vector(image, face_info["bounding_box"], face_info.get("_detection"))
         
         return jsonify({
             "success": True,
@@ -2,10 +2,9 @@
 Database models for Face Recognition Server
 """
 
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Integer
+from sqlalchemy import create_engine, Column, String, DateTime, Text, Integer, LargeBinary, Index, func, delete
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from datetime import datetime
+from sqlalchemy.orm import sessionmaker, Session, defer
 import os
 import uuid
 from sqlalchemy.dialects.postgresql import UUID
@@ -29,11 +28,26 @@ class RegisteredFace(Base):
     additional_info = Column(Text)
     bounding_box = Column(Text)  # JSON string of bounding box coordinates
     landmarks = Column(Text)     # JSON string of landmarks
-    face_vector = Column(Text)   # JSON string of face encoding/vector (128-dimensional)
-    image_data = Column(Text)    # Base64 encoded image data
-    created_at = Column(DateTime(timezone=True), default=datetime.now)
+    face_vector = Column(Text)   # Legacy JSON string of face encoding/vector (128-dimensional)
+    face_vector_blob = Column(LargeBinary)  # Raw float32 bytes of the face vector
+    face_vector_i8 = Column(LargeBinary)  # float32 scale + L2-normalized face vector quantized to int8
+    face_vector_model = Column(String)    # Extractor that produced the vector ("histogram" or "sface")
+    image_data = Column(Text)    # Legacy base64 encoded image data (see update_database.offload_image_data)
+    image_url = Column(String)   # Location of the face image in file/object storage
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (Index('idx_faces_name', 'person_name'),)
 
-engine = create_engine(DATABASE_URL, echo=False)
+# Keep warm connections for the request threads; LIFO lets idle extras age out via pool_recycle
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+    pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    pool_recycle=1800,
+    pool_use_lifo=True
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
@@ -47,7 +61,7 @@ def get_db():
         db.close()
 
 # CRUD Operations
-def create_face(db: Session, person_name: str, relationship: str, additional_info: str, bounding_box: str, landmarks: str, face_vector: str, image_data: str = None):
+def create_face(db: Session, person_name: str, relationship: str, additional_info: str, bounding_box: str, landmarks: str, face_vector: str = None, image_data: str = None, face_vector_i8: bytes = None, face_vector_model: str = None, face_vector_blob: bytes = None, image_url: str = None):
     db_face = RegisteredFace(
         person_name=person_name,
         relationship=relationship,
@@ -55,26 +69,50 @@ def create_face(db: Session, person_name: str, relationship: str, additional_inf
         bounding_box=bounding_box,
         landmarks=landmarks,
         face_vector=face_vector,
-        image_data=image_data
+        face_vector_blob=face_vector_blob,
+        face_vector_i8=face_vector_i8,
+        face_vector_model=face_vector_model,
+        image_data=image_data,
+        image_url=image_url
     )
     db.add(db_face)
     db.commit()
     db.refresh(db_face)
     return db_face
 
-def get_all_faces(db: Session):
-    return db.query(RegisteredFace).all()
+def get_all_faces(db: Session, include_image: bool = True):
+    query = db.query(RegisteredFace)
+    if not include_image:
+        # image_data is base64 and dwarfs every other column
+        query = query.options(defer(RegisteredFace.image_data))
+    return query.all()
+
+def get_all_faces_metadata(db: Session):
+    """Fetch listing columns only, with the stored vector reduced to its byte length"""
+    return db.query(
+        RegisteredFace.id,
+        RegisteredFace.person_name,
+        RegisteredFace.relationship,
+        RegisteredFace.additional_info,
+        RegisteredFace.created_at,
+        func.length(RegisteredFace.face_vector_blob).label("vector_bytes"),
+        RegisteredFace.face_vector.isnot(None).label("has_json_vector")
+    ).all()
+
+def get_face_ids(db: Session):
+    """Fetch only the ids of registered faces, for cheap change detection"""
+    return [row[0] for row in db.query(RegisteredFace.id).all()]
 
 def get_face_by_id(db: Session, face_id: str):
     return db.query(RegisteredFace).filter(RegisteredFace.id == face_id).first()
 
 def delete_face(db: Session, face_id: str):
-    face = db.query(RegisteredFace).filter(RegisteredFace.id == face_id).first()
-    if face:
-        db.delete(face)
-        db.commit()
-        return True
-    return False
+    """Delete a face in one round trip; returns the deleted (id, image_url) row, or None if not found"""
+    deleted = db.execute(
+        delete(RegisteredFace).where(RegisteredFace.id == uuid.UUID(str(face_id))).returning(RegisteredFace.id, RegisteredFace.image_url)
+    ).first()
+    db.commit()
+    return deleted
 
 def delete_all_faces(db: Session):
     """Delete all registered faces"""
@@ -0,0 +1,80 @@
+"""
+Face image storage for Face Recognition Server
+
+Registered face images live outside the database; rows only keep the image URL.
+S3 is used when FACE_IMAGE_BUCKET is set, local disk otherwise. Local disk only counts as
+durable when FACE_IMAGE_DIR is set explicitly and we are not on a Heroku dyno, whose
+filesystem is thrown away on every restart.
+"""
+
+import os
+from typing import Optional
+
+try:
+    import boto3
+except ImportError:  # only needed when FACE_IMAGE_BUCKET selects S3
+    boto3 = None
+
+class LocalImageStorage:
+    """Stores images as files under a directory, addressed by file:// URLs"""
+
+    def __init__(self, root: str, durable: bool = False):
+        self.root = root
+        self.durable = durable
+        os.makedirs(root, exist_ok=True)
+
+    def save(self, key: str, data: bytes) -> str:
+        path = os.path.join(self.root, key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return f"file://{os.path.abspath(path)}"
+
+    def load(self, url: str) -> bytes:
+        with open(url[len("file://"):], 'rb') as f:
+            return f.read()
+
+    def delete(self, url: str):
+        try:
+            os.remove(url[len("file://"):])
+        except FileNotFoundError:
+            pass
+
+class S3ImageStorage:
+    """Stores images as objects in an S3 bucket, addressed by s3:// URLs"""
+
+    durable = True
+
+    def __init__(self, bucket: str, prefix: str = "faces/"):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3")
+
+    def _object_key(self, url: str) -> str:
+        return url[len(f"s3://{self.bucket}/"):]
+
+    def save(self, key: str, data: bytes) -> str:
+        object_key = f"{self.prefix}{key}"
+        self.client.put_object(Bucket=self.bucket, Key=object_key, Body=data, ContentType="image/jpeg")
+        return f"s3://{self.bucket}/{object_key}"
+
+    def load(self, url: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._object_key(url))["Body"].read()
+
+    def delete(self, url: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(url))
+
+def create_image_storage():
+    """Pick the storage backend from the environment"""
+    bucket: Optional[str] = os.getenv("FACE_IMAGE_BUCKET")
+    if bucket:
+        if boto3 is None:
+            raise RuntimeError("FACE_IMAGE_BUCKET is set but boto3 is not installed")
+        print(f"✅ Storing face images in s3://{bucket}")
+        return S3ImageStorage(bucket)
+    root = os.getenv("FACE_IMAGE_DIR")
+    durable = root is not None and "DYNO" not in os.environ
+    if not durable:
+        print("⚠️ No durable face image storage configured (set FACE_IMAGE_BUCKET), face images will not be stored")
+    return LocalImageStorage(root or os.path.join(os.path.dirname(os.path.abspath(__file__)), "faces"), durable=durable)
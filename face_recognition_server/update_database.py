@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 """
-Database migration script to add face_vector column
+Database migration script to add face vector columns
 """
 
 from database import engine
 from sqlalchemy import text
 
-def add_face_vector_column():
-    """Add face_vector column to registered_faces table"""
+def add_column(column_name, column_type):
+    """Add a column to registered_faces table if it does not exist"""
     try:
         with engine.connect() as conn:
             # Check if column already exists
@@ -15,24 +15,123 @@ def add_face_vector_column():
                 SELECT column_name 
                 FROM information_schema.columns 
                 WHERE table_name='registered_faces' 
-                AND column_name='face_vector'
-            """))
+                AND column_name=:column_name
+            """), {"column_name": column_name})
             
             if result.fetchone():
-                print("✅ face_vector column already exists")
+                print(f"✅ {column_name} column already exists")
                 return True
             
-            # Add the face_vector column
-            conn.execute(text('ALTER TABLE registered_faces ADD COLUMN face_vector TEXT'))
+            # Add the column
+            conn.execute(text(f'ALTER TABLE registered_faces ADD COLUMN {column_name} {column_type}'))
             conn.commit()
-            print("✅ Successfully added face_vector column to registered_faces table")
+            print(f"✅ Successfully added {column_name} column to registered_faces table")
             return True
             
     except Exception as e:
         print(f"❌ Error adding column: {e}")
         return False
 
+def add_face_vector_column():
+    """Add face_vector column to registered_faces table"""
+    return add_column('face_vector', 'TEXT')
+
+def add_face_vector_i8_column():
+    """Add quantized face_vector_i8 column to registered_faces table"""
+    return add_column('face_vector_i8', 'BYTEA')
+
+def add_face_vector_model_column():
+    """Add face_vector_model column to registered_faces table"""
+    return add_column('face_vector_model', 'VARCHAR')
+
+def add_face_vector_blob_column():
+    """Add binary face_vector_blob column to registered_faces table"""
+    return add_column('face_vector_blob', 'BYTEA')
+
+def backfill_face_vector_blobs():
+    """Convert legacy JSON face vectors into raw float32 bytes"""
+    import json
+    import numpy as np
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT id, face_vector
+                FROM registered_faces
+                WHERE face_vector IS NOT NULL
+                AND face_vector_blob IS NULL
+            """)).fetchall()
+            
+            for face_id, face_vector in rows:
+                blob = np.asarray(json.loads(face_vector), dtype=np.float32).tobytes()
+                conn.execute(text("UPDATE registered_faces SET face_vector_blob = :blob WHERE id = :id"),
+                             {"blob": blob, "id": face_id})
+            conn.commit()
+            print(f"✅ Backfilled face_vector_blob for {len(rows)} faces")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Error backfilling face vectors: {e}")
+        return False
+
+def add_image_url_column():
+    """Add image_url column to registered_faces table"""
+    return add_column('image_url', 'VARCHAR')
+
+def offload_image_data():
+    """Move base64 image_data out of the database into image storage"""
+    import base64
+    from storage import create_image_storage
+    storage = create_image_storage()
+    if not storage.durable:
+        # image_data is cleared after the copy, so the copy must survive this process
+        print("❌ Not offloading face images: no durable image storage configured (set FACE_IMAGE_BUCKET)")
+        return False
+    try:
+        with engine.connect() as conn:
+            ids = [row[0] for row in conn.execute(text("""
+                SELECT id
+                FROM registered_faces
+                WHERE image_data IS NOT NULL
+                AND image_url IS NULL
+            """)).fetchall()]
+            
+            # One row at a time so only a single image is held in memory
+            for face_id in ids:
+                image_data = conn.execute(text("SELECT image_data FROM registered_faces WHERE id = :id"),
+                                          {"id": face_id}).scalar()
+                image_url = storage.save(f"{face_id}.jpg", base64.b64decode(image_data))
+                conn.execute(text("UPDATE registered_faces SET image_url = :url, image_data = NULL WHERE id = :id"),
+                             {"url": image_url, "id": face_id})
+                conn.commit()
+            print(f"✅ Moved {len(ids)} face images to storage")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Error offloading face images: {e}")
+        return False
+
+def add_defaults_and_indexes():
+    """Let the database stamp created_at and index person_name"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE registered_faces ALTER COLUMN created_at SET DEFAULT now()"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_faces_name ON registered_faces (person_name)"))
+            conn.commit()
+            print("✅ created_at default and person_name index are in place")
+            return True
+            
+    except Exception as e:
+        print(f"❌ Error adding defaults and indexes: {e}")
+        return False
+
 if __name__ == "__main__":
     add_face_vector_column()
+    add_face_vector_i8_column()
+    add_face_vector_model_column()
+    add_face_vector_blob_column()
+    backfill_face_vector_blobs()
+    add_image_url_column()
+    offload_image_data()
+    add_defaults_and_indexes()
 
 
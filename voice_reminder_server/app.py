@@ -1,12 +1,29 @@
 from flask import Flask, request, jsonify
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import json
 from datetime import datetime
 import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
 app = Flask(__name__)
 
+def _pooled_session(retry_post: bool):
+    """Session that keeps TLS connections alive and retries transient upstream errors"""
+    session = requests.Session()
+    retries = Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=None if retry_post else Retry.DEFAULT_ALLOWED_METHODS)
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=retries))
+    return session
+
+_openai = _pooled_session(retry_post=True)
+# Retrying a VAPI POST could place the same phone call twice, so only reads are retried
+_vapi = _pooled_session(retry_post=False)
+
 # VAPI Configuration
 VAPI_API_KEY = os.environ.get("VAPI_API_KEY", "19de0c70-e127-4e3d-b65b-833376a4de0c")
 VAPI_BASE_URL = "https://api.vapi.ai"
@@ -17,7 +34,54 @@ PHONE_NUMBER_ID = "e90ccb0c-f63b-4651-9a02-5f6110637a79"
 # OpenAI Configuration
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "YOUR_OPENAI_API_KEY_HERE")
 
+# Recently processed reminders, keyed by normalized text and date (relative dates depend on the day)
+REMINDER_CACHE_SIZE = int(os.environ.get("REMINDER_CACHE_SIZE", 2048))
+_reminder_cache = OrderedDict()
+_reminder_cache_lock = threading.Lock()
+# Requests currently waiting on OpenAI, so identical concurrent reminders share one call
+_reminder_inflight = {}
+# Bulk uploads fan out over a shared pool instead of calling OpenAI serially
+_openai_pool = ThreadPoolExecutor(max_workers=8)
+
+def _reminder_cache_key(text: str):
+    """Case- and whitespace-insensitive key for a reminder on the current day"""
+    normalized = " ".join(text.lower().split()).rstrip(".!?")
+    return normalized, datetime.now().date().isoformat()
+
 def process_voice_reminder(text: str):
+    """Process voice reminder text, reusing the result for a repeated reminder"""
+    key = _reminder_cache_key(text)
+    with _reminder_cache_lock:
+        cached = _reminder_cache.get(key)
+        if cached is not None:
+            _reminder_cache.move_to_end(key)
+        else:
+            pending = _reminder_inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = _reminder_inflight[key] = Future()
+    if cached is not None:
+        return json.loads(cached)
+    if not owner:
+        cached = pending.result()
+        return json.loads(cached) if cached else None
+    
+    cached = None
+    try:
+        reminder_data = _extract_reminder(text)
+        cached = json.dumps(reminder_data) if reminder_data else None
+    finally:
+        with _reminder_cache_lock:
+            # Failures are not cached so the next request retries OpenAI
+            if cached:
+                _reminder_cache[key] = cached
+                if len(_reminder_cache) > REMINDER_CACHE_SIZE:
+                    _reminder_cache.popitem(last=False)
+            del _reminder_inflight[key]
+        pending.set_result(cached)
+    return reminder_data
+
+def _extract_reminder(text: str):
     """Process voice reminder text using OpenAI to extract structured data"""
     
     system_prompt = """You are a voice reminder assistant for an Alzheimer's support app called Cherish. Your role is to help users create structured reminders by listening to their voice commands and extracting key information.
@@ -78,7 +142,7 @@ Return ONLY a JSON object with this structure:
     }
     
     try:
-        response = requests.post(
+        response = _openai.post(
             "https://api.openai.com/v1/chat/completions",
             headers=headers,
             json=data,
@@ -140,7 +204,7 @@ def create_vapi_call(phone_number: str, message: str):
     }
     
     try:
-        response = requests.post(
+        response = _vapi.post(
             f"{VAPI_BASE_URL}/call",
             headers=headers,
             json=call_data,
@@ -199,6 +263,34 @@ def process_voice_reminder_endpoint():
             "message": f"Error: {str(e)}"
         }), 500
 
+@app.route('/process-voice-reminders', methods=['POST'])
+def process_voice_reminders_endpoint():
+    """Process a batch of voice reminder texts concurrently"""
+    try:
+        data = request.json or {}
+        texts = data.get('texts', [])
+        
+        if not texts or not isinstance(texts, list):
+            return jsonify({
+                "success": False,
+                "message": "No texts provided"
+            }), 400
+        
+        # Duplicates within the batch coalesce onto one OpenAI call
+        reminders = list(_openai_pool.map(lambda text: process_voice_reminder(text) if text else None, texts))
+        
+        return jsonify({
+            "success": all(reminders),
+            "reminders": reminders,
+            "message": f"Processed {sum(1 for r in reminders if r)} of {len(texts)} voice reminders"
+        }), 200
+            
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Error: {str(e)}"
+        }), 500
+
 @app.route('/create-voice-call', methods=['POST'])
 def create_voice_call():
     """Create a VAPI call for voice reminder"""
@@ -244,7 +336,7 @@ def get_call_status(call_id):
             "Content-Type": "application/json"
         }
         
-        response = requests.get(
+        response = _vapi.get(
             f"{VAPI_BASE_URL}/call/{call_id}",
             headers=headers,
             timeout=30
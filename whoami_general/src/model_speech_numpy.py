@@ -8,6 +8,7 @@ class SpeechLoadModel:
     def __init__(self, lam: float = 1e-2):
         self.lam = lam
         self.beta = None
+        self._beta32 = None
         self.cols = None
 
     def fit(self, df: pd.DataFrame):
@@ -15,17 +16,26 @@ class SpeechLoadModel:
         X = df[["wpm","pause_rate","ttr","jitter","artic_rate"]].values
         y = df["cog_load_true"].values
         n = X.shape[0]
-        X_ = np.column_stack([np.ones(n), X])
-        I = np.eye(X_.shape[1]); I[0,0] = 0
-        self.beta = np.linalg.inv(X_.T @ X_ + self.lam * I) @ X_.T @ y
+        k = X.shape[1]
+        # Ridge as extra rows: [1 X; 0 sqrt(lam)*I] beta ~ [y; 0], leaving the intercept unpenalized
+        Xa = np.zeros((n + k, k + 1))
+        Xa[:n, 0] = 1.0
+        Xa[:n, 1:] = X
+        Xa[n:, 1:] = np.sqrt(self.lam) * np.eye(k)
+        ya = np.concatenate([y, np.zeros(k)])
+        self.beta, *_ = np.linalg.lstsq(Xa, ya, rcond=None)
+        self._beta32 = self.beta.astype(np.float32)
         self.cols = ["intercept","wpm","pause_rate","ttr","jitter","artic_rate"]
         return self
 
-    def predict(self, df: pd.DataFrame) -> np.ndarray:
-        X = df[["wpm","pause_rate","ttr","jitter","artic_rate"]].values
-        n = X.shape[0]
-        X_ = np.column_stack([np.ones(n), X])
-        yhat = X_ @ self.beta
+    def predict(self, df) -> np.ndarray:
+        # accepts the feature frame or an (n, 5) array already in feature order
+        # float32 features and coefficients halve the memory traffic of the GEMV
+        if isinstance(df, np.ndarray):
+            X = df.astype(np.float32, copy=False)
+        else:
+            X = df[["wpm","pause_rate","ttr","jitter","artic_rate"]].to_numpy(dtype=np.float32, copy=False)
+        yhat = X @ self._beta32[1:] + self._beta32[0]
         return np.clip(yhat, 0, 5)
 
     def band(self, score: float) -> str:
@@ -0,0 +1,150 @@
+import numpy as np
+from .utils import lat_bin
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional; the episode loops then run as plain Python
+    NUMBA_AVAILABLE = False
+    prange = range
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+@njit(cache=True)
+def _sidx(d, s, l, b):
+    return ((d*4 + s)*3 + l)*3 + b
+
+@njit(cache=True)
+def seed_episode_rng(seed):
+    """Seed numba's own np.random stream used by the compiled loops."""
+    np.random.seed(seed)
+
+@njit(cache=True)
+def _draw_session(n_items):
+    """All random draws of one session (3 uniforms and 1 normal per item), taken serially
+    from numba's stream so results do not depend on how items are split across threads."""
+    return np.random.random((n_items, 3)), np.random.standard_normal(n_items)
+
+@njit(cache=True, fastmath=True)
+def _simulate_item(Q, eps, intervals, d, st, last_lat, band, u, z):
+    """choose_action, step_env and reward for one item against the session's Q snapshot.
+
+    Returns (row, action, reward, next_row, correct, latency, next_streak).
+    """
+    n_actions = Q.shape[-1]
+    row = _sidx(d, st, lat_bin(last_lat), band)   # st is kept clipped to 0..3
+
+    # epsilon-greedy action
+    if u[0] < eps:
+        a = int(u[1] * n_actions)
+    else:
+        a = int(np.argmax(Q[row]))
+
+    # simulated recall & latency
+    base = 0.55 + 0.15*np.log1p(intervals[a]/30) - 0.15*d - 0.12*band
+    p_correct = min(max(base, 0.05), 0.95)
+    correct = u[2] < p_correct
+    mu = 2.5 + 1.0*d + 0.8*band + (0.0 if correct else 0.8)
+    lat = max(0.5, mu + 0.8*z)
+    r = (1.0 if correct else -0.3) + max(0.0, 3.5 - lat) * 0.1
+
+    # The load band does not change within a session
+    st_next = 0
+    if correct:
+        st_next = st + 1
+        if st_next > 3: st_next = 3
+    return row, a, r, _sidx(d, st_next, lat_bin(lat), band), correct, lat, st_next
+
+@njit(cache=True, fastmath=True)
+def _batch_update(Q, alpha, gamma, rows, actions, rewards, next_rows):
+    """Every TD error is taken against the pre-update table, then all are applied."""
+    n_items = rows.shape[0]
+    td = np.empty(n_items, dtype=np.float64)
+    for i in range(n_items):
+        td[i] = rewards[i] + gamma*np.max(Q[next_rows[i]]) - Q[rows[i], actions[i]]
+    for i in range(n_items):
+        Q[rows[i], actions[i]] += alpha*td[i]
+
+@njit(cache=True, fastmath=True)
+def run_episode(Q, alpha, gamma, eps, intervals, difficulties, band, item_streak, item_last_latency,
+                correct_out, latency_out):
+    """One review session over every item: choose_action, step_env, reward and update inlined.
+
+    Q is the flat (states, actions) table. Actions are chosen with the table as it was at the
+    start of the session and all Q updates are applied together at the end (batch Q-learning).
+    The per-item streak/latency records are updated in place and the outcome of item i is
+    written to correct_out[i] and latency_out[i].
+    """
+    u, z = _draw_session(difficulties.shape[0])
+    run_episode_drawn(Q, alpha, gamma, eps, intervals, difficulties, band, item_streak, item_last_latency,
+                      u, z, correct_out, latency_out)
+
+@njit(cache=True, fastmath=True)
+def run_episode_drawn(Q, alpha, gamma, eps, intervals, difficulties, band, item_streak, item_last_latency,
+                      u, z, correct_out, latency_out):
+    """run_episode with the session's draws given: u is (n_items, 3) uniforms, z (n_items,) normals."""
+    n_items = difficulties.shape[0]
+    rows = np.empty(n_items, dtype=np.int64)
+    actions = np.empty(n_items, dtype=np.int64)
+    rewards = np.empty(n_items, dtype=np.float64)
+    next_rows = np.empty(n_items, dtype=np.int64)
+    for i in range(n_items):
+        row, a, r, next_row, correct, lat, st_next = _simulate_item(
+            Q, eps, intervals, difficulties[i], item_streak[i], item_last_latency[i], band, u[i], z[i])
+        rows[i] = row
+        actions[i] = a
+        rewards[i] = r
+        next_rows[i] = next_row
+        item_streak[i] = st_next
+        item_last_latency[i] = lat
+        correct_out[i] = 1 if correct else 0
+        latency_out[i] = lat
+    _batch_update(Q, alpha, gamma, rows, actions, rewards, next_rows)
+
+@njit(cache=True, fastmath=True, parallel=True, nogil=True)
+def run_episode_parallel(Q, alpha, gamma, eps, intervals, difficulties, band, item_streak, item_last_latency,
+                         correct_out, latency_out):
+    """run_episode with the items of the session spread across cores.
+
+    Given the start-of-session Q snapshot the items are independent: each iteration writes only
+    its own transition slot and item record, and the single batch update runs serially after.
+    """
+    n_items = difficulties.shape[0]
+    rows = np.empty(n_items, dtype=np.int64)
+    actions = np.empty(n_items, dtype=np.int64)
+    rewards = np.empty(n_items, dtype=np.float64)
+    next_rows = np.empty(n_items, dtype=np.int64)
+    u, z = _draw_session(n_items)
+    for i in prange(n_items):
+        row, a, r, next_row, correct, lat, st_next = _simulate_item(
+            Q, eps, intervals, difficulties[i], item_streak[i], item_last_latency[i], band, u[i], z[i])
+        rows[i] = row
+        actions[i] = a
+        rewards[i] = r
+        next_rows[i] = next_row
+        item_streak[i] = st_next
+        item_last_latency[i] = lat
+        correct_out[i] = 1 if correct else 0
+        latency_out[i] = lat
+    _batch_update(Q, alpha, gamma, rows, actions, rewards, next_rows)
+
+@njit(cache=True, fastmath=True, parallel=True)
+def run_batch_episode(Q, alpha, gamma, eps, intervals, difficulties, bands, item_streak, item_last_latency,
+                      u, z, correct_out, latency_out):
+    """run_episode_drawn for B independent learners at once; every array carries a leading learner axis.
+
+    Learners share no state, so they are spread across cores. The draws u (B, n_items, 3) and
+    z (B, n_items) come from the caller, since prange threads do not share the seeded stream.
+    """
+    for k in prange(Q.shape[0]):
+        run_episode_drawn(Q[k], alpha, gamma, eps, intervals, difficulties, bands[k], item_streak[k],
+                          item_last_latency[k], u[k], z[k], correct_out[k], latency_out[k])
+
+if NUMBA_AVAILABLE:
+    # Compile (or load from cache) at import so the first session is not charged for it
+    for _episode in (run_episode, run_episode_parallel):
+        _episode(np.zeros((3*4*3*3, 4), dtype=np.float32), 0.2, 0.9, 0.2, np.array([30, 60, 120, 240]),
+                 np.zeros(1, dtype=np.int64), 0, np.zeros(1, dtype=np.int8), np.ones(1),
+                 np.zeros(1, dtype=np.int64), np.zeros(1))
@@ -1,26 +1,53 @@
 
 import numpy as np
-from .utils import band_id, latency_bin
+from .utils import band_id, latency_bin, latency_bins
+from .scheduler_qlearning_numba import NUMBA_AVAILABLE, run_episode_parallel, run_batch_episode, seed_episode_rng
+
+RNG_BLOCK = 4096  # scalar draws fetched from the Generator at a time
 
 class SRSchedulerQL:
     """Tabular Q-learning spaced-retrieval scheduler."""
-    def __init__(self, alpha=0.2, gamma=0.9, eps=0.2):
+    def __init__(self, alpha=0.2, gamma=0.9, eps=0.2, seed=None):
         self.alpha = alpha
         self.gamma = gamma
         self.eps = eps
         self.intervals = np.array([30, 60, 120, 240])  # seconds
         self.A = len(self.intervals)
-        self.Q = np.zeros((3, 4, 3, 3, self.A))  # diff, streak(0..3), latbin(0..2), band(0..2), actions
+        # One contiguous row per state (diff, streak 0..3, latbin 0..2, band 0..2); see _sidx
+        self.Q = np.zeros((3*4*3*3, self.A), dtype=np.float32)
+        # Per-step draws come from pre-drawn blocks of one Generator (seed may be an int or a Generator)
+        self.rng = np.random.default_rng(seed)
+        if NUMBA_AVAILABLE:
+            # The compiled loop has its own stream; derive it from the Generator so runs reproduce
+            seed_episode_rng(int(self.rng.integers(2**31)))
+        self._uniforms = self._normals = np.empty(0)
+        self._u_pos = self._n_pos = 0
+
+    def _uniform(self):
+        if self._u_pos == len(self._uniforms):
+            self._uniforms, self._u_pos = self.rng.random(RNG_BLOCK), 0
+        self._u_pos += 1
+        return self._uniforms[self._u_pos - 1]
+
+    def _normal(self):
+        if self._n_pos == len(self._normals):
+            self._normals, self._n_pos = self.rng.standard_normal(RNG_BLOCK), 0
+        self._n_pos += 1
+        return self._normals[self._n_pos - 1]
+
+    @staticmethod
+    def _sidx(d, s, l, b):
+        return ((d*4 + s)*3 + l)*3 + b
 
     def choose_action(self, d, s, l, b):
-        if np.random.rand() < self.eps:
-            return np.random.randint(self.A)
-        return int(np.argmax(self.Q[d,s,l,b,:]))
+        if self._uniform() < self.eps:
+            return int(self._uniform() * self.A)
+        return int(self.Q[self._sidx(d, s, l, b)].argmax())
 
     def update(self, d, s, l, b, a, r, d2, s2, l2, b2):
-        best_next = np.max(self.Q[d2, s2, l2, b2, :])
-        old = self.Q[d,s,l,b,a]
-        self.Q[d,s,l,b,a] = (1-self.alpha)*old + self.alpha*(r + self.gamma*best_next)
+        best_next = self.Q[self._sidx(d2, s2, l2, b2)].max()
+        row = self.Q[self._sidx(d, s, l, b)]
+        row[a] = (1-self.alpha)*row[a] + self.alpha*(r + self.gamma*best_next)
 
     def step_env(self, difficulty, interval, load_band_lbl):
         # Simulates recall & latency
@@ -28,10 +55,101 @@ class SRSchedulerQL:
         base -= 0.15*difficulty
         base -= 0.12*band_id(load_band_lbl)
         p_correct = float(np.clip(base, 0.05, 0.95))
-        correct = np.random.rand() < p_correct
+        correct = self._uniform() < p_correct
         mu = 2.5 + 1.0*difficulty + 0.8*band_id(load_band_lbl) + (0.8 if not correct else 0.0)
-        latency = max(0.5, np.random.normal(mu, 0.8))
+        latency = max(0.5, mu + 0.8*self._normal())
         return int(correct), float(latency)
 
     def reward(self, correct, latency):
         return (1.0 if correct else -0.3) + max(0.0, (3.5 - latency)) * 0.1
+
+    def run_session(self, difficulties, load_band, item_streak, item_last_latency, out=None):
+        """Run one session over all items in the compiled episode loop (items in parallel).
+
+        choose_action/step_env/reward per item, with the update of every item applied
+        together at the end of the session; load_band is a label or a band id.
+        item_streak and item_last_latency are updated in place. Returns per-item
+        (correct, latency), written into out=(correct, latency) when given so callers
+        can reuse buffers.
+        """
+        difficulties = np.ascontiguousarray(difficulties, dtype=np.int64)
+        if difficulties.min(initial=0) < 0 or difficulties.max(initial=0) >= 3:
+            raise ValueError("difficulty must be in 0..2")
+        if item_streak.dtype != np.int8 or item_last_latency.dtype != np.float64:
+            raise TypeError("item_streak must be int8 and item_last_latency float64")
+        # Streaks are stored already clipped, so the episode loops index with them directly
+        if item_streak.min(initial=0) < 0 or item_streak.max(initial=0) > 3:
+            raise ValueError("item_streak must be in 0..3")
+        if out is None:
+            out = (np.empty(len(difficulties), dtype=np.int64), np.empty(len(difficulties), dtype=np.float64))
+        correct, latency = out
+        band = int(load_band) if isinstance(load_band, (int, np.integer)) else band_id(load_band)
+        if not 0 <= band < 3:
+            raise ValueError("load band id must be in 0..2")
+        if NUMBA_AVAILABLE:
+            run_episode_parallel(self.Q, float(self.alpha), float(self.gamma), float(self.eps), self.intervals,
+                                 difficulties, band, item_streak, item_last_latency, correct, latency)
+        else:
+            # Without numba the same batch session is cheaper as whole-array NumPy ops
+            self._run_episode_vectorized(difficulties, band, item_streak, item_last_latency, correct, latency)
+        return correct, latency
+
+    def _run_episode_vectorized(self, difficulties, band, item_streak, item_last_latency, correct_out, latency_out):
+        """NumPy version of run_episode: every item of the session at once, same batch update."""
+        n = len(difficulties)
+        rows = self._sidx(difficulties, item_streak, latency_bins(item_last_latency), band)
+
+        # epsilon-greedy for all items: one argmax over the (n, A) tile of their Q rows
+        greedy = self.Q[rows].argmax(axis=1)
+        explore = self.rng.random(n) < self.eps
+        actions = np.where(explore, self.rng.integers(0, self.A, n), greedy)
+
+        # simulated recall & latency, reward
+        base = 0.55 + 0.15*np.log1p(self.intervals[actions]/30) - 0.15*difficulties - 0.12*band
+        correct = self.rng.random(n) < np.clip(base, 0.05, 0.95)
+        mu = 2.5 + 1.0*difficulties + 0.8*band + np.where(correct, 0.0, 0.8)
+        lat = np.maximum(0.5, self.rng.normal(mu, 0.8))
+        r = np.where(correct, 1.0, -0.3) + np.maximum(0.0, 3.5 - lat) * 0.1
+
+        # batch Q backup against the pre-update table; repeated (state, action) pairs accumulate
+        st_next = np.where(correct, np.minimum(item_streak + 1, 3), 0)
+        next_rows = self._sidx(difficulties, st_next, latency_bins(lat), band)
+        td = r + self.gamma*self.Q[next_rows].max(axis=1) - self.Q[rows, actions]
+        np.add.at(self.Q, (rows, actions), self.alpha*td)
+
+        item_streak[:] = st_next
+        item_last_latency[:] = lat
+        correct_out[:] = correct
+        latency_out[:] = lat
+
+class BatchSRSchedulerQL(SRSchedulerQL):
+    """B independent simulated learners, each with its own Q table, trained together."""
+    def __init__(self, n_learners, alpha=0.2, gamma=0.9, eps=0.2, seed=None):
+        super().__init__(alpha=alpha, gamma=gamma, eps=eps, seed=seed)
+        self.B = n_learners
+        self.Q = np.zeros((n_learners,) + self.Q.shape, dtype=np.float32)  # learner, state, actions
+
+    def run_session(self, difficulties, load_band_lbls, item_streak, item_last_latency):
+        """One session for every learner; load_band_lbls has one label per learner and the
+        item records are (B, n_items). Returns per-learner, per-item (correct, latency)."""
+        difficulties = np.ascontiguousarray(difficulties, dtype=np.int64)
+        if difficulties.min(initial=0) < 0 or difficulties.max(initial=0) >= 3:
+            raise ValueError("difficulty must be in 0..2")
+        if item_streak.shape != (self.B, len(difficulties)) or item_last_latency.shape != item_streak.shape:
+            raise ValueError("item records must have shape (n_learners, n_items)")
+        if item_streak.dtype != np.int8 or item_last_latency.dtype != np.float64:
+            raise TypeError("item_streak must be int8 and item_last_latency float64")
+        # Streaks are stored already clipped, so the episode loops index with them directly
+        if item_streak.min(initial=0) < 0 or item_streak.max(initial=0) > 3:
+            raise ValueError("item_streak must be in 0..3")
+        bands = np.array([band_id(lbl) for lbl in load_band_lbls], dtype=np.int8)
+        if len(bands) != self.B:
+            raise ValueError("need one load band per learner")
+        correct = np.empty(item_streak.shape, dtype=np.int64)
+        latency = np.empty(item_streak.shape, dtype=np.float64)
+        # Draw every learner's randoms here from the seeded Generator so runs reproduce
+        u = self.rng.random(item_streak.shape + (3,))
+        z = self.rng.standard_normal(item_streak.shape)
+        run_batch_episode(self.Q, float(self.alpha), float(self.gamma), float(self.eps), self.intervals,
+                          difficulties, bands, item_streak, item_last_latency, u, z, correct, latency)
+        return correct, latency
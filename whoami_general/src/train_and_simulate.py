@@ -1,13 +1,25 @@
 
+import argparse
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # headless: skip GUI backend detection
 import matplotlib.pyplot as plt
 from pathlib import Path
 from .model_speech_numpy import SpeechLoadModel
 from .scheduler_qlearning_numpy import SRSchedulerQL
-from .utils import band_from_score, band_id, latency_bin, save_csv
+from .utils import BAND_LABELS, band_ids_from_scores, save_csv
 
-def main():
+def _needs_render(fig_path, src_mtime, force=False):
+    """True unless fig_path already exists and is newer than the data it is drawn from."""
+    return force or not fig_path.exists() or fig_path.stat().st_mtime <= src_mtime
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the speech model, simulate sessions and export the report.")
+    parser.add_argument("--force", action="store_true", help="redraw figures even if they are up to date")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)   # one PCG64 stream for the whole simulation
     base = Path(__file__).resolve().parents[1]
     data_dir = base / "data"
     out_dir = base / "outputs"
@@ -18,83 +30,87 @@ def main():
 
     # Train speech model (NumPy ridge)
     sm = SpeechLoadModel(lam=1e-2).fit(speech)
-    speech["cog_load_pred"] = sm.predict(speech)
-    speech["load_band"] = speech["cog_load_pred"].apply(band_from_score)
+    cog_load_pred = sm.predict(speech)
+    load_band_ids = band_ids_from_scores(cog_load_pred)   # int8, 0=low..2=high
+    speech["cog_load_pred"] = cog_load_pred
+    speech["load_band"] = BAND_LABELS[load_band_ids]
 
     # Initialize scheduler
-    sched = SRSchedulerQL(alpha=0.2, gamma=0.9, eps=0.2)
+    sched = SRSchedulerQL(alpha=0.2, gamma=0.9, eps=0.2, seed=rng)
 
     N_ITEMS = len(items)
     N_SESSIONS = 40
-    item_streak = np.zeros(N_ITEMS, dtype=int)
-    item_last_latency = np.random.uniform(2,6,size=N_ITEMS)
+    difficulties = items["difficulty"].to_numpy(dtype=np.int64)   # 0..2
+    item_streak = np.zeros(N_ITEMS, dtype=np.int8)   # 0..3, kept clipped
+    item_last_latency = rng.uniform(2,6,size=N_ITEMS)
 
-    session_acc, session_lat, session_band = [], [], []
+    # Per-item outcome buffers are reused by every session
+    corrects = np.empty(N_ITEMS, dtype=np.int64)
+    lats = np.empty(N_ITEMS, dtype=np.float64)
+    session_acc = np.empty(N_SESSIONS)
+    session_lat = np.empty(N_SESSIONS)
+    session_band_ids = np.empty(N_SESSIONS, dtype=np.int8)
 
     for s in range(N_SESSIONS):
         day = min(s, len(speech)-1)
-        lb = speech.iloc[day]["load_band"]
-        corrects = []
-        lats = []
-        for i in range(N_ITEMS):
-            d = int(items.iloc[i]["difficulty"])   # 0..2
-            st = min(item_streak[i], 3)
-            lbid = band_id(lb)
-            lbid_next = lbid
-
-            a = sched.choose_action(d, st, latency_bin(item_last_latency[i]), lbid)
-            interval = sched.intervals[a]
-
-            correct, lat = sched.step_env(difficulty=d, interval=interval, load_band_lbl=lb)
-            r = sched.reward(correct, lat)
-
-            st_next = min(st + 1, 3) if correct else 0
-            l_next = latency_bin(lat)
-            sched.update(d, st, latency_bin(item_last_latency[i]), lbid, a, r, d, st_next, l_next, lbid_next)
-
-            item_streak[i] = st_next
-            item_last_latency[i] = lat
-            corrects.append(int(correct))
-            lats.append(float(lat))
-
-        session_acc.append(float(np.mean(corrects)))
-        session_lat.append(float(np.mean(lats)))
-        session_band.append(lb)
+        lb = load_band_ids[day]
+        sched.run_session(difficulties, lb, item_streak, item_last_latency, out=(corrects, lats))
+
+        session_acc[s] = corrects.mean()
+        session_lat[s] = lats.mean()
+        session_band_ids[s] = lb
 
     # Report
     report = pd.DataFrame({
         "session": np.arange(1, N_SESSIONS+1),
         "mean_recall_accuracy": session_acc,
         "mean_latency_sec": session_lat,
-        "load_band": session_band
+        "load_band": BAND_LABELS[session_band_ids]   # labels only for the CSV
     })
 
     # Simple support-needed score for clinician view
-    lbw = report["load_band"].map({"low":0,"moderate":1,"high":2}).values
-    risk = (1.0-report["mean_recall_accuracy"]) * 0.6 + (report["mean_latency_sec"]/10.0) * 0.25 + (lbw/2.0) * 0.15
-    report["support_needed_score_0to1"] = np.clip(risk, 0, 1)
+    # (1-acc)*0.6 + (lat/10)*0.25 + (lbw/2)*0.15, accumulated in place in one buffer
+    lbw = session_band_ids.astype(np.float64)
+    risk = np.multiply(session_acc, -0.6)
+    risk += 0.6
+    lbw *= 0.075
+    risk += lbw
+    risk += np.multiply(session_lat, 0.025, out=lbw)
+    report["support_needed_score_0to1"] = np.clip(risk, 0, 1, out=risk)
 
     save_csv(report, out_dir / "clinician_report_general.csv")
     save_csv(speech, out_dir / "speech_model_predictions.csv")
 
-    # Plots
-    plt.figure(figsize=(8,4))
-    plt.plot(report["session"], report["mean_recall_accuracy"], linewidth=2)
-    plt.title("Mean Recall Accuracy per Session")
-    plt.xlabel("Session"); plt.ylabel("Accuracy (0–1)"); plt.tight_layout()
-    plt.savefig(out_dir / "fig_accuracy.png", dpi=150); plt.close()
-
-    plt.figure(figsize=(8,4))
-    plt.plot(report["session"], report["mean_latency_sec"], linewidth=2)
-    plt.title("Mean Response Latency per Session")
-    plt.xlabel("Session"); plt.ylabel("Latency (sec)"); plt.tight_layout()
-    plt.savefig(out_dir / "fig_latency.png", dpi=150); plt.close()
-
-    plt.figure(figsize=(6,5))
-    plt.scatter(speech["cog_load_true"], speech["cog_load_pred"], s=18)
-    plt.xlabel("True Cognitive Load (synthetic)"); plt.ylabel("Predicted Load")
-    plt.title("Speech Model — True vs Predicted"); plt.tight_layout()
-    plt.savefig(out_dir / "fig_true_vs_pred.png", dpi=150); plt.close()
+    # Plots (one figure, cleared and reused for each). The simulation is seeded, so the
+    # report is a function of the input data and of this code (model, scheduler, hyperparameters):
+    # figures newer than all of those are left as they are.
+    sources = [data_dir / "synthetic_speech.csv", data_dir / "items.csv", *Path(__file__).parent.glob("*.py")]
+    src_mtime = max(path.stat().st_mtime for path in sources)
+    fig_paths = [out_dir / "fig_accuracy.png", out_dir / "fig_latency.png", out_dir / "fig_true_vs_pred.png"]
+    stale = [_needs_render(path, src_mtime, args.force) for path in fig_paths]
+    if any(stale):
+        fig, ax = plt.subplots(figsize=(8,4))
+        if stale[0]:
+            ax.plot(report["session"], report["mean_recall_accuracy"], linewidth=2)
+            ax.set_title("Mean Recall Accuracy per Session")
+            ax.set_xlabel("Session"); ax.set_ylabel("Accuracy (0–1)"); fig.tight_layout()
+            fig.savefig(fig_paths[0], dpi=150); ax.clear()
+
+        if stale[1]:
+            ax.plot(report["session"], report["mean_latency_sec"], linewidth=2)
+            ax.set_title("Mean Response Latency per Session")
+            ax.set_xlabel("Session"); ax.set_ylabel("Latency (sec)"); fig.tight_layout()
+            fig.savefig(fig_paths[1], dpi=150); ax.clear()
+
+        if stale[2]:
+            fig.set_size_inches(6,5)
+            ax.scatter(speech["cog_load_true"], speech["cog_load_pred"], s=18)
+            ax.set_xlabel("True Cognitive Load (synthetic)"); ax.set_ylabel("Predicted Load")
+            ax.set_title("Speech Model — True vs Predicted"); fig.tight_layout()
+            fig.savefig(fig_paths[2], dpi=150)
+        plt.close(fig)
+    else:
+        print("Figures up to date, not redrawn (use --force to redraw)")
 
     # Print a quick console summary
     print("Speech model coefficients:", sm.coef())
@@ -2,6 +2,14 @@
 import numpy as np
 import pandas as pd
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional; the scalar kernels below then run as plain Python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
 def band_from_score(x: float) -> str:
     if x < 1.5: return "low"
     if x < 3.0: return "moderate"
@@ -15,5 +23,27 @@ def latency_bin(lat: float) -> int:
     if lat < 6: return 1
     return 2
 
+@njit(cache=True, inline='always')
+def band_id_from_score(x: float) -> int:
+    """Scalar band id for jitted loops (band_id(band_from_score(x)) without the strings)."""
+    return 0 if x < 1.5 else (1 if x < 3.0 else 2)
+
+@njit(cache=True, inline='always')
+def lat_bin(lat: float) -> int:
+    """latency_bin for jitted loops."""
+    return 0 if lat < 3.0 else (1 if lat < 6.0 else 2)
+
+_BAND_EDGES = np.array([1.5, 3.0])
+_LAT_EDGES = np.array([3.0, 6.0])
+BAND_LABELS = np.array(["low", "moderate", "high"], dtype=object)
+
+def band_ids_from_scores(x) -> np.ndarray:
+    """Vectorized band_from_score as band ids (0=low, 1=moderate, 2=high)."""
+    return np.searchsorted(_BAND_EDGES, x, side="right").astype(np.int8)
+
+def latency_bins(lat) -> np.ndarray:
+    """Vectorized latency_bin."""
+    return np.searchsorted(_LAT_EDGES, lat, side="right").astype(np.int8)
+
 def save_csv(df: pd.DataFrame, path):
     df.to_csv(path, index=False)